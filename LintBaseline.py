@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+"""
+Module for gating lint outputs against a baseline: a compact
+file of fingerprints of the messages we have accepted.
+"""
+
+import os
+import sys
+import struct
+import hashlib
+from bisect import bisect_left, bisect_right
+from array import array
+import common as cmn
+from LintDiff import normalize_desc
+
+## File layout: magic, version, count, then 'count' little-endian
+## unsigned 64 bit fingerprints sorted in ascending order.
+MAGIC = 'LINTBASE'
+BASELINE_VERSION = 1
+header_fmt = '<8sII'
+FP_SIZE = struct.calcsize('<Q')
+
+## Fingerprints are held in an array when the platform's unsigned
+## long is 64 bit, else in a list unpacked with 'struct'.
+fp_in_array = array('L').itemsize == FP_SIZE
+
+def pack_fingerprints(fps):
+    """
+    Return the file payload of the list of fingerprints 'fps'.
+    """
+    if not fp_in_array:
+        return struct.pack('<%dQ' % len(fps), *fps)
+    fps = array('L', fps)
+    if sys.byteorder != 'little':
+        fps.byteswap()
+    return fps.tostring()
+
+def unpack_fingerprints(data):
+    """
+    Return the fingerprints of file payload 'data', a sorted
+    sequence 'bisect' can search.
+    """
+    if not fp_in_array:
+        return list(struct.unpack('<%dQ' % (len(data) // FP_SIZE), data))
+    fps = array('L')
+    fps.fromstring(data)
+    if sys.byteorder != 'little':
+        fps.byteswap()
+    return fps
+
+def fingerprint(msg_id, fname, desc):
+    """
+    Return the 64 bit fingerprint of a message. Line numbers
+    are left out so moved code keeps its fingerprint.
+    """
+    key = '%d\0%s\0%s' % (msg_id, fname, normalize_desc(desc))
+    return struct.unpack('<Q', hashlib.md5(key).digest()[:8])[0]
+
+def write_baseline(lintres, path):
+    """
+    Write the baseline of processed 'lintres' to 'path'.
+    """
+    lintres.materialize_all()
+    store = lintres.store
+    fnames = store.fnames
+    fps = sorted(fingerprint(store.msg_ids[rec], fnames[store.file_ids[rec]],
+                             store.desc(rec))
+                 for rec in lintres.get_recs())
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(struct.pack(header_fmt, MAGIC, BASELINE_VERSION, len(fps)))
+        f.write(pack_fingerprints(fps))
+    os.rename(tmp, path)
+
+class LintBaseline(object):
+    """
+    class LintBaseline holds the sorted fingerprints of a baseline
+    file and checks lint outputs against them.
+
+    A message of a checked output is new when its fingerprint
+    occurs more often in the output than in the baseline.
+    Only the baseline and a count per matched fingerprint are
+    held in memory, the checked output is streamed.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            magic, version, count = struct.unpack(header_fmt,
+                                                  f.read(struct.calcsize(header_fmt)))
+            if magic != MAGIC or version != BASELINE_VERSION:
+                raise ValueError('%s is not a version %d lint baseline'
+                                 % (path, BASELINE_VERSION))
+            data = f.read(count * FP_SIZE)
+            if len(data) != count * FP_SIZE:
+                raise ValueError('%s is truncated' % (path))
+            self.fps = unpack_fingerprints(data)
+
+    def iter_new(self, output_path):
+        """
+        Stream the lint output 'output_path' and yield
+        (message_id, file, line#, description) of every new message.
+        """
+        src_len = len(cmn.src_path)
+        patobj = cmn.lint_msg_re
+        fps = self.fps
+        nfps = len(fps)
+        seen = {}
+        with open(output_path, 'r') as f:
+            for line in f:
+                m = patobj.search(line)
+                if not m:
+                    continue
+                ## Split 'path:line#:desc' like 'LintResult.parse_line'.
+                elems = line.rstrip('\n').split(':', 2)
+                msg_id = int(m.group(1))
+                fname = elems[0][src_len:]
+                fp = fingerprint(msg_id, fname, elems[2])
+                i = bisect_left(fps, fp)
+                if i == nfps or fps[i] != fp:
+                    yield msg_id, fname, int(elems[1]), elems[2]
+                    continue
+                ## In the baseline, new only if it occurs more often.
+                cnt = seen.get(fp, 0) + 1
+                if cnt > 1 and cnt > bisect_right(fps, fp) - i:
+                    yield msg_id, fname, int(elems[1]), elems[2]
+                else:
+                    seen[fp] = cnt
+
+    def gate(self, output_path, collect=False, out=sys.stdout):
+        """
+        Check 'output_path' against the baseline and print new
+        messages to 'out'. Stop at the first one unless 'collect'.
+        Return the number of new messages found.
+        """
+        nnew = 0
+        for msg_id, fname, line, desc in self.iter_new(output_path):
+            print >> out, '%s:%d:%s' % (fname, line, desc)
+            nnew += 1
+            if not collect:
+                break
+        return nnew
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+"""
+Module for caching processed 'LintResult' objects on disk,
+so an unchanged lint output doesn't need to be parsed again.
+"""
+
+import os
+import hashlib
+import cPickle
+import common as cmn
+
+## Bump it whenever the layout of 'LintResult' changes,
+## cache entries with another version are thrown away.
+CACHE_VERSION = 6
+
+class LintCache(object):
+    """
+    class LintCache stores the state of processed 'LintResult'
+    objects under a cache directory.
+
+    Each entry is made of two files named after the path of
+    the lint output:
+    1. '<key>.hdr'
+       A small header with the cache version, 'cmn.src_path', and the
+       size, mtime and md5 digest of the lint output.
+    2. '<key>.dat'
+       The pickled state of the 'LintResult'.
+
+    An entry is valid if version and source path match and the
+    output has the same size and mtime. If only the mtime differs
+    the content digest decides, and the header is refreshed.
+    """
+    def __init__(self, cache_dir='./cache'):
+        self.cache_dir = cache_dir
+        try:
+            os.mkdir(self.cache_dir)
+        except OSError:
+            pass
+
+    ## Internal methods
+
+    def entry_paths(self, path):
+        """
+        Return (header, data) file paths of the entry for 'path'.
+        """
+        key = hashlib.md5(os.path.abspath(path)).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return base + '.hdr', base + '.dat'
+
+    def content_hash(self, path):
+        """
+        Return the md5 digest of the file 'path'.
+        """
+        md5 = hashlib.md5()
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(1 << 20)
+                if not block:
+                    break
+                md5.update(block)
+        return md5.hexdigest()
+
+    def make_header(self, path, digest=None):
+        st = os.stat(path)
+        if digest is None:
+            digest = self.content_hash(path)
+        return {'version' : CACHE_VERSION,
+                'src_path' : cmn.src_path,
+                'size' : st.st_size,
+                'mtime' : st.st_mtime,
+                'digest' : digest}
+
+    def write_header(self, hdr_path, header):
+        tmp = hdr_path + '.tmp'
+        with open(tmp, 'wb') as f:
+            cPickle.dump(header, f, cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, hdr_path)
+
+    def remove(self, path):
+        for fname in self.entry_paths(path):
+            try:
+                os.remove(fname)
+            except OSError:
+                pass
+
+    def is_valid(self, path, hdr_path):
+        """
+        Check the header of the entry against the lint output 'path'.
+        """
+        try:
+            with open(hdr_path, 'rb') as f:
+                header = cPickle.load(f)
+        except (IOError, EOFError, cPickle.UnpicklingError):
+            return False
+
+        if header.get('version') != CACHE_VERSION:
+            ## Stale format, throw it away.
+            self.remove(path)
+            return False
+
+        if header['src_path'] != cmn.src_path:
+            return False
+
+        st = os.stat(path)
+        if header['size'] != st.st_size:
+            return False
+        if header['mtime'] == st.st_mtime:
+            return True
+
+        ## Touched or copied, but the content may still be the same.
+        digest = self.content_hash(path)
+        if digest != header['digest']:
+            return False
+        self.write_header(hdr_path, self.make_header(path, digest))
+        return True
+
+    ## End of internal methods.
+
+    def load(self, lintres):
+        """
+        Restore 'lintres' from the cache.
+        Return True on a cache hit, False otherwise.
+        """
+        path = os.path.join(lintres.path, lintres.fname)
+        hdr_path, dat_path = self.entry_paths(path)
+        if not self.is_valid(path, hdr_path):
+            return False
+
+        try:
+            with open(dat_path, 'rb') as f:
+                state = cPickle.load(f)
+        except (IOError, EOFError, cPickle.UnpicklingError):
+            return False
+
+        ## Keep the name the result was opened with.
+        state['fname'] = lintres.fname
+        state['path'] = lintres.path
+        lintres.__dict__.update(state)
+        return True
+
+    def store(self, lintres):
+        """
+        Save the state of a processed 'lintres' into the cache.
+        """
+        path = os.path.join(lintres.path, lintres.fname)
+        hdr_path, dat_path = self.entry_paths(path)
+        header = self.make_header(path)
+
+        ## Drop the old header and write data first,
+        ## the header validates the entry.
+        try:
+            os.remove(hdr_path)
+        except OSError:
+            pass
+        tmp = dat_path + '.tmp'
+        with open(tmp, 'wb') as f:
+            cPickle.dump(lintres.__getstate__(), f, cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, dat_path)
+        self.write_header(hdr_path, header)
@@ -1,9 +1,12 @@
 #!/usr/bin/env python
 
-import sys
-from operator import itemgetter
-import common as cmn
 import os
+import multiprocessing
+from StringIO import StringIO
+import common as cmn
+
+## Buffer size of the report file.
+BUFSIZE = 1 << 20
 
 class LintCmp(object):
     """
@@ -16,185 +19,214 @@ class LintCmp(object):
         self.nres = new_lintres
 
     def cmp_msg_cnt_by_type(self):
-        mc_old = self.ores.get_msg_count_prob_by_type()
+        mc_old = dict((t, c) for t, c, p in self.ores.get_msg_count_prob_by_type())
         mc_new = self.nres.get_msg_count_prob_by_type()
 
         cmp_type = []
-        for i in range(0, len(mc_old)):
-            mtype = mc_old[i][0]
-            cnt_old = mc_old[i][1]
-            cnt_new = mc_new[i][1]
+        for mtype, cnt_new, prob in mc_new:
+            cnt_old = mc_old.get(mtype, 0)
             diff = cnt_old - cnt_new
             cmp_type.append((mtype, cnt_old, cnt_new, diff))
 
         return cmp_type
 
+    def join_msgids(self, mtype):
+        """
+        Join old and new message ids of type 'mtype' on the id.
+        Return [(message_id, old_count, new_count)] sorted by id,
+        the count is 0 where a result doesn't have the message.
+        """
+        idcnt_o = dict((m, c) for m, c, p in self.ores.get_msgid_count_prob_by_type(mtype))
+        idcnt_n = dict((m, c) for m, c, p in self.nres.get_msgid_count_prob_by_type(mtype))
+        return [(m, idcnt_o.get(m, 0), idcnt_n.get(m, 0))
+                for m in sorted(set(idcnt_o) | set(idcnt_n))]
+
+    def get_fcnt(self, lintres, msgid):
+        """
+        Return a dict mapping file name to count of 'msgid' in 'lintres'.
+        """
+        if not lintres.has_msg(msgid):
+            return {}
+        hlist, clist = lintres.get_flist_by_id(msgid)
+        fcnt = dict(hlist)
+        fcnt.update(clist)
+        return fcnt
+
+    def iter_file_rows(self, msgids):
+        """
+        Join old and new files of each message id in 'msgids'.
+        Yield (message_id, file, old_count, new_count) rows,
+        sorted by file name within a message id.
+        """
+        for msgid in msgids:
+            fcnt_o = self.get_fcnt(self.ores, msgid)
+            fcnt_n = self.get_fcnt(self.nres, msgid)
+            for f in sorted(set(fcnt_o) | set(fcnt_n)):
+                yield msgid, f, fcnt_o.get(f, 0), fcnt_n.get(f, 0)
+
     def cmp_msg_total(self):
         told = self.ores.get_total()
         tnew = self.nres.get_total()
+        if told == 0:
+            ## Nothing to drop from, e.g. the old output filtered to empty.
+            return told, tnew, 0.0
         return told, tnew, float(told-tnew)/told
 
-    def report_msgtypes(self, cmp_type, told, tnew, rate):
-        print '+' * 40
-        print 'Lint comparison report.'
-        print '+' * 40
-
-        print
-        print 'Message Type'.ljust(18),
-        print 'ID Range'.ljust(12),
-        print 'Old Count'.ljust(12),
-        print 'New Count'.ljust(12),
-        print 'Difference(Old - New)'.ljust(15)
-        print '-' * 80
+    def report_msgtypes(self, out, cmp_type, told, tnew, rate):
+        print >> out, '+' * 40
+        print >> out, 'Lint comparison report.'
+        print >> out, '+' * 40
+
+        print >> out
+        print >> out, 'Message Type'.ljust(18),
+        print >> out, 'ID Range'.ljust(12),
+        print >> out, 'Old Count'.ljust(12),
+        print >> out, 'New Count'.ljust(12),
+        print >> out, 'Difference(Old - New)'.ljust(15)
+        print >> out, '-' * 80
         for mtype, oc, nc, diff in cmp_type:
             mrange = cmn.getRangeOfMsgType(mtype) 
-            print str(mtype).ljust(18),
-            print (str(mrange[0])+' ~ '+str(mrange[1]-1)).ljust(12),
-            print str(oc).ljust(12), str(nc).ljust(12),
-            print str(diff).ljust(15)
-
-        print '-' * 80
-        print 'Old Total:', told
-        print 'New Total:', tnew
-        print 'Total Messages number decreased:', told-tnew
-        if rate >= 0:
-            print 'Total Message dropped by', '{0:.1f}%'.format(rate*100)
+            print >> out, str(mtype).ljust(18),
+            print >> out, (str(mrange[0])+' ~ '+str(mrange[1]-1)).ljust(12),
+            print >> out, str(oc).ljust(12), str(nc).ljust(12),
+            print >> out, str(diff).ljust(15)
+
+        print >> out, '-' * 80
+        print >> out, 'Old Total:', told
+        print >> out, 'New Total:', tnew
+        print >> out, 'Total Messages number decreased:', told-tnew
+        if told == 0:
+            print >> out, 'No old message to compute a rate from.'
+        elif rate >= 0:
+            print >> out, 'Total Message dropped by', '{0:.1f}%'.format(rate*100)
         else:
-            print 'Total Message increased by', '{0:.1f}%'.format(-rate*100)
-        print
+            print >> out, 'Total Message increased by', '{0:.1f}%'.format(-rate*100)
+        print >> out
 
-    def report_msgids(self, comb_id_cnt):
+    def report_msgids(self, out, comb_id_cnt):
         """
         comb_id_cnt: [message_id, old_count, new_count]
         """
-        print
-        print 'Message ID'.ljust(12),
-        print 'Old Count'.ljust(10),
-        print 'New Count'.ljust(10),
-        print 'Difference(old-new)'
-        print '-' * 55
+        print >> out
+        print >> out, 'Message ID'.ljust(12),
+        print >> out, 'Old Count'.ljust(10),
+        print >> out, 'New Count'.ljust(10),
+        print >> out, 'Difference(old-new)'
+        print >> out, '-' * 55
         for m, oc, nc in comb_id_cnt:
-            print str(m).ljust(12),
-            print str(oc).ljust(10), str(nc).ljust(10),
-            print oc-nc
-        print '-' * 55
-        print
-
-    def report_file_by_id(self, msgids):
-        print '\nComparsion by message ID.'
-        for msgid in msgids:
-            print '\nMessage ID:', msgid
-            print
-            print 'File Name'.ljust(50),
-            print 'Old Count'.ljust(10),
-            print 'New Count'.ljust(10),
-            print 'Difference(Old - New)'
-            print '-' * 95
-
-            fcnt_o = []
-            flist_o = []
-            if self.ores.has_msg(msgid):
-                hlist, clist = self.ores.get_flist_by_id(msgid)
-                fcnt_o = hlist + clist
-                flist_o = [f for f, c in fcnt_o]
-                
-            fcnt_n = []
-            flist_n = []
-            if self.nres.has_msg(msgid):
-                hlist, clist = self.nres.get_flist_by_id(msgid)
-                fcnt_n = hlist + clist
-                flist_n = [f for f, c in fcnt_n]
-
-            same_fs = set(flist_o).intersection(flist_n)
-            diff_o2n = set(flist_o) - set(flist_n)
-            diff_n2o = set(flist_n) - set(flist_o)
-
-            comb = []
-            for f in same_fs:
-                index_o = flist_o.index(f)
-                index_n = flist_n.index(f)
-                comb.append((f, fcnt_o[index_o][1], fcnt_n[index_n][1]))
-
-            for f in diff_o2n:
-                index_o = flist_o.index(f)
-                comb.append((f, fcnt_o[index_o][1], 0))
-
-            for f in diff_n2o:
-                index_n = flist_n.index(f)
-                comb.append((f, 0, fcnt_n[index_n][1]))
-
-            for f, oc, nc in comb:
-                print f.ljust(50),
-                print str(oc).ljust(10),
-                print str(nc).ljust(10),
-                print (oc-nc)
-                    
-            print
-
-    def report(self, mtypes=['Syntax_Errors', 'Warnings']):
-        cmp_type = self.cmp_msg_cnt_by_type()
-        told, tnew, rate = self.cmp_msg_total()
-                
-        old_stdout = sys.stdout
-        fn = 'comparison_report_'+self.ores.get_fname_suffix()+\
-            '_'+self.nres.get_fname_suffix()+'.txt'
-        sys.stdout = open(os.path.join('./report', fn), 'w')
-
-        self.report_msgtypes(cmp_type, told, tnew, rate)
-
-        print 'Detailed comparsion of a specific message type.\n'
+            print >> out, str(m).ljust(12),
+            print >> out, str(oc).ljust(10), str(nc).ljust(10),
+            print >> out, oc-nc
+        print >> out, '-' * 55
+        print >> out
+
+    def print_file_header(self, out, msgid):
+        print >> out, '\nMessage ID:', msgid
+        print >> out
+        print >> out, 'File Name'.ljust(50),
+        print >> out, 'Old Count'.ljust(10),
+        print >> out, 'New Count'.ljust(10),
+        print >> out, 'Difference(Old - New)'
+        print >> out, '-' * 95
+
+    def report_file_by_id(self, out, rows):
+        """
+        rows: (message_id, file, old_count, new_count) grouped
+        by message id, as yielded by 'iter_file_rows'.
+        The block of each message id ends with a blank line.
+        """
+        cur_id = None
+        for msgid, f, oc, nc in rows:
+            if msgid != cur_id:
+                if cur_id is not None:
+                    print >> out
+                self.print_file_header(out, msgid)
+                cur_id = msgid
+            print >> out, f.ljust(50),
+            print >> out, str(oc).ljust(10),
+            print >> out, str(nc).ljust(10),
+            print >> out, (oc-nc)
+
+        if cur_id is not None:
+            print >> out
+
+    def report_by_type(self, out, mtypes, pool=None):
+        print >> out, 'Detailed comparsion of a specific message type.\n'
         for mtype in mtypes:
-            print '*' * 30
-            print 'Message Type:', mtype
-            print '*' * 30
-            print
-            idcnt_o = self.ores.get_msgid_count_prob_by_type(mtype)
-            ids_o = [v[0] for v in idcnt_o]
-            idcnt_n = self.nres.get_msgid_count_prob_by_type(mtype)
-            ids_n = [v[0] for v in idcnt_n]
+            print >> out, '*' * 30
+            print >> out, 'Message Type:', mtype
+            print >> out, '*' * 30
+            print >> out
+            comb = self.join_msgids(mtype)
 
             ## IDs that old result have but new result doesn't,
             ## that is, messages that we have cleared out.
-            diff_o2n = set(ids_o) - set(ids_n)
+            diff_o2n = [m for m, oc, nc in comb if nc == 0]
 
             ## IDs that new result has but old result doesn't,
             ## that is, messages that we have introduced.
-            diff_n2o = set(ids_n) - set(ids_o)
+            diff_n2o = [m for m, oc, nc in comb if oc == 0]
 
-            same_ids = set(ids_o).intersection(set(ids_n))
-
-            comb = []
-            if diff_o2n == set([]): ## No message gone.
-                print 'No old messages have been cleared out.\n'
+            if diff_o2n == []: ## No message gone.
+                print >> out, 'No old messages have been cleared out.\n'
             else:
-                print 'Old new Messages have been cleared out.',
-                print 'They are:', str(list(diff_o2n)).strip('[]')
+                print >> out, 'Old new Messages have been cleared out.',
+                print >> out, 'They are:', str(diff_o2n).strip('[]')
                 
-            if diff_n2o == set([]): ## No message introduced.
-                print 'No message have been introduced.'
+            if diff_n2o == []: ## No message introduced.
+                print >> out, 'No message have been introduced.'
             else:
-                print 'New messages have been introduce.',
-                print 'They are:', str(list(diff_n2o)).strip('[]')
+                print >> out, 'New messages have been introduce.',
+                print >> out, 'They are:', str(diff_n2o).strip('[]')
 
-            for m in same_ids:
-                index_o = ids_o.index(m)
-                index_n = ids_n.index(m)
-                comb.append((m, idcnt_o[index_o][1], idcnt_n[index_n][1]))
+            self.report_msgids(out, comb)
 
-            for m in diff_o2n:
-                index_o = ids_o.index(m)
-                comb.append((m, idcnt_o[index_o][1], 0))
+            print >> out, '\nComparsion by message ID.'
+            msgids = [m for m, oc, nc in comb]
+            if pool is None:
+                self.report_file_by_id(out, self.iter_file_rows(msgids))
+            else:
+                for text in pool.imap(render_file_rows, msgids):
+                    out.write(text)
 
-            for m in diff_n2o:
-                index_n = ids_n.index(m)
-                comb.append((m, 0, idcnt_n[index_n][1]))
+    def report(self, mtypes=['Syntax_Errors', 'Warnings'], workers=1):
+        """
+        Write the comparison report. With 'workers' greater than
+        one the file rows of each message id are rendered in a pool
+        of processes sharing this object, and written in order.
+        """
+        cmp_type = self.cmp_msg_cnt_by_type()
+        told, tnew, rate = self.cmp_msg_total()
 
-            comb.sort(key=itemgetter(0))
-            self.report_msgids(comb)
-            self.report_file_by_id([m for m,oc,nc in comb])
+        fn = 'comparison_report_'+self.ores.get_fname_suffix()+\
+            '_'+self.nres.get_fname_suffix()+'.txt'
+        pool = None
+        if workers > 1:
+            pool = multiprocessing.Pool(workers, init_cmp_worker, (self,))
+        try:
+            with open(os.path.join('./report', fn), 'w', BUFSIZE) as out:
+                self.report_msgtypes(out, cmp_type, told, tnew, rate)
+                self.report_by_type(out, mtypes, pool)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
 
-        sys.stdout = old_stdout
         print '\nComprasion report %s has been generated.' % (fn)
         print
 
-        
+## The 'LintCmp' of a report, set in each pool worker.
+worker_cmp = None
+
+def init_cmp_worker(lintcmp):
+    global worker_cmp
+    worker_cmp = lintcmp
+
+def render_file_rows(msgid):
+    """
+    Return the file rows block of 'msgid' of the report,
+    rendered in a worker process.
+    """
+    out = StringIO()
+    worker_cmp.report_file_by_id(out, worker_cmp.iter_file_rows([msgid]))
+    return out.getvalue()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+
+"""
+Module for storing processed lint results in a local SQLite
+database and querying them back through indexed queries.
+"""
+
+import os
+import sqlite3
+from itertools import islice
+import common as cmn
+from LintTree import DirTree
+
+## Number of records inserted per 'executemany' call.
+BATCH_SIZE = 100000
+
+schema = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE,
+    total INTEGER,
+    size INTEGER,
+    mtime REAL
+);
+CREATE TABLE IF NOT EXISTS type_counts (
+    run_id INTEGER,
+    mtype TEXT,
+    count INTEGER
+);
+CREATE TABLE IF NOT EXISTS records (
+    run_id INTEGER,
+    seq INTEGER,
+    msg_id INTEGER,
+    file TEXT,
+    line INTEGER,
+    desc TEXT
+);
+'''
+
+indexes = '''
+CREATE INDEX IF NOT EXISTS records_msg_id ON records (run_id, msg_id, file);
+CREATE INDEX IF NOT EXISTS records_file_line ON records (run_id, file, line);
+'''
+
+class LintDB(object):
+    """
+    class LintDB is a SQLite database holding any number of runs,
+    each one a processed 'LintResult' loaded under a name.
+
+    Tables:
+    1. runs(id, name, total, size, mtime)
+       'size' and 'mtime' are those of the lint output loaded,
+       NULL if the run isn't a whole output.
+    2. type_counts(run_id, mtype, count)
+    3. records(run_id, seq, msg_id, file, line, desc)
+       'seq' is the order of the record in the lint output.
+       Indexed on (run_id, msg_id, file) and (run_id, file, line).
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connect()
+        self.conn.executescript(schema)
+        ## Databases created before runs had 'size' and 'mtime'.
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(runs)')]
+        with self.conn:
+            for column, ctype in (('size', 'INTEGER'), ('mtime', 'REAL')):
+                if column not in columns:
+                    self.conn.execute('ALTER TABLE runs ADD COLUMN %s %s'
+                                      % (column, ctype))
+
+    def connect(self):
+        self.conn = sqlite3.connect(self.db_path)
+        ## Lint output is bytes, keep it that way.
+        self.conn.text_factory = str
+
+    def reconnect(self):
+        """
+        Open a connection of our own in a forked process. The one
+        inherited is kept referenced, closing it would close the
+        parent's database handle.
+        """
+        self.inherited_conn = self.conn
+        self.connect()
+
+    def get_run_id(self, name):
+        row = self.conn.execute('SELECT id FROM runs WHERE name = ?',
+                                (name,)).fetchone()
+        if row is None:
+            raise KeyError('No run %s in the database' % (name))
+        return row[0]
+
+    def get_runs(self):
+        return [name for (name,) in
+                self.conn.execute('SELECT name FROM runs ORDER BY id')]
+
+    def delete_run(self, name):
+        with self.conn:
+            for (run_id,) in self.conn.execute('SELECT id FROM runs WHERE name = ?',
+                                               (name,)).fetchall():
+                self.conn.execute('DELETE FROM records WHERE run_id = ?', (run_id,))
+                self.conn.execute('DELETE FROM type_counts WHERE run_id = ?', (run_id,))
+                self.conn.execute('DELETE FROM runs WHERE id = ?', (run_id,))
+
+    def get_stamp(self, lintres):
+        """
+        Return (size, mtime) of the lint output of processed 'lintres',
+        or (None, None) if it is only a selection of the output.
+        """
+        if lintres.recs is not None:
+            return None, None
+        st = os.stat(os.path.join(lintres.path, lintres.fname))
+        return st.st_size, st.st_mtime
+
+    def has_current_run(self, lintres, name=None):
+        """
+        Return True if run 'name' was loaded from the lint output of
+        'lintres' as it is now, same size and mtime.
+        """
+        if name is None:
+            name = lintres.fname
+        size, mtime = self.get_stamp(lintres)
+        if size is None:
+            return False
+        row = self.conn.execute('SELECT size, mtime FROM runs WHERE name = ?',
+                                (name,)).fetchone()
+        return row is not None and tuple(row) == (size, mtime)
+
+    def iter_records(self, run_id, lintres):
+        for seq, record in enumerate(lintres.iter_records()):
+            yield (run_id, seq) + record
+
+    def ingest(self, lintres, name=None):
+        """
+        Bulk load processed 'lintres' as run 'name', replacing
+        a run of the same name. Return the name of the run.
+        """
+        if name is None:
+            name = lintres.fname
+        self.delete_run(name)
+
+        with self.conn:
+            size, mtime = self.get_stamp(lintres)
+            cur = self.conn.execute('INSERT INTO runs (name, total, size, mtime) '
+                                    'VALUES (?, ?, ?, ?)',
+                                    (name, lintres.get_total(), size, mtime))
+            run_id = cur.lastrowid
+            self.conn.executemany('INSERT INTO type_counts VALUES (?, ?, ?)',
+                                  [(run_id, t, c) for t, c in
+                                   lintres.msg_count_by_type.iteritems()])
+            records = self.iter_records(run_id, lintres)
+            while True:
+                batch = list(islice(records, BATCH_SIZE))
+                if not batch:
+                    break
+                self.conn.executemany('INSERT INTO records VALUES (?, ?, ?, ?, ?, ?)',
+                                      batch)
+            self.conn.executescript(indexes)
+
+        return name
+
+class DBResult(object):
+    """
+    class DBResult answers the query interface of 'LintResult'
+    for a run stored in a 'LintDB', with indexed SQL queries.
+    """
+    def __init__(self, db, name):
+        self.db = db
+        self.conn = db.conn
+        self.fname = name
+        self.run_id = db.get_run_id(name)
+        self.total_msg_num = self.conn.execute('SELECT total FROM runs WHERE id = ?',
+                                               (self.run_id,)).fetchone()[0]
+        self.dir_tree = None
+
+    def reconnect(self):
+        """
+        Call in a forked process before querying.
+        """
+        self.db.reconnect()
+        self.conn = self.db.conn
+
+    def query(self, sql, *args):
+        return self.conn.execute(sql, (self.run_id,) + args)
+
+    def query_by_type(self, sql, mtype, group_by):
+        """
+        Run 'sql' on the records of type 'mtype', or of any type if
+        it's None, grouped by 'group_by'.
+        """
+        if mtype is None:
+            return self.query(sql + ' WHERE run_id = ? GROUP BY ' + group_by)
+        lo, hi = cmn.getRangeOfMsgType(mtype)
+        return self.query(sql + ' WHERE run_id = ? AND msg_id >= ? AND msg_id < ? '
+                          'GROUP BY ' + group_by, lo, hi)
+
+    ## Misc Interface
+
+    def has_msg(self, msgid):
+        return self.query('SELECT 1 FROM records WHERE run_id = ? AND msg_id = ? LIMIT 1',
+                          msgid).fetchone() is not None
+
+    def get_fname_suffix(self):
+        """
+        Return suffix of the name the run was stored under,
+        like 'LintResult.get_fname_suffix'.
+        """
+        return self.fname.split('.')[1]
+
+    def get_total(self):
+        return self.total_msg_num
+
+    def materialize_all(self):
+        pass
+
+    def iter_records(self):
+        return self.query('SELECT msg_id, file, line, desc FROM records '
+                          'WHERE run_id = ? ORDER BY seq')
+
+    ## End of misc interface.
+
+    ## Interface for querying messages by type.
+
+    def get_msg_count_prob_by_type(self):
+        mtypecnt = self.query('SELECT mtype, count FROM type_counts '
+                              'WHERE run_id = ? ORDER BY mtype DESC').fetchall()
+        if self.total_msg_num == 0:
+            return [(t, c, 0.0) for t, c in mtypecnt]
+        return [(t, c, float(c)/self.total_msg_num) for t, c in mtypecnt]
+
+    def get_msgid_count_prob_by_type(self, mtype):
+        lo, hi = cmn.getRangeOfMsgType(mtype)
+        idcnt = self.query('SELECT msg_id, COUNT(*) FROM records '
+                           'WHERE run_id = ? AND msg_id >= ? AND msg_id < ? '
+                           'GROUP BY msg_id ORDER BY msg_id', lo, hi).fetchall()
+        return [(mid, c, float(c)/self.total_msg_num) for mid, c in idcnt]
+
+    ## End of Interface for querying messages by type.
+
+    ## Interface for querying messages by message id.
+
+    def get_flist_by_id(self, msgid):
+        fcnt = self.query('SELECT file, COUNT(*) FROM records '
+                          'WHERE run_id = ? AND msg_id = ? '
+                          'GROUP BY file ORDER BY file', msgid).fetchall()
+        if not fcnt:
+            raise KeyError(msgid)
+        hlist = [(f, c) for f, c in fcnt if not f.endswith('.c')]
+        clist = [(f, c) for f, c in fcnt if f.endswith('.c')]
+        return (hlist, clist)
+
+    def get_info_by_id_and_file(self, msgid, fname):
+        return self.query('SELECT line, desc FROM records '
+                          'WHERE run_id = ? AND msg_id = ? AND file = ? '
+                          'ORDER BY line, seq', msgid, fname).fetchall()
+
+    def get_file_linenum_by_id(self, msgid):
+        fn2lnums = {}
+        for f, line in self.query('SELECT file, line FROM records '
+                                  'WHERE run_id = ? AND msg_id = ? '
+                                  'ORDER BY file, line', msgid):
+            fn2lnums.setdefault(f, []).append(line)
+        return fn2lnums
+
+    ## End of Interface for querying messages by message id.
+
+    ## Interface for querying message, line number by file.
+
+    def get_files_by_type(self, ftype):
+        files = [f for (f,) in self.query('SELECT DISTINCT file FROM records '
+                                          'WHERE run_id = ? ORDER BY file')]
+        if ftype == 'c':
+            return [f for f in files if f.endswith('.c')]
+        return [f for f in files if f.endswith('.h') or f.endswith('inl')]
+
+    def get_cnt_linenums_by_fname(self, fname):
+        rows = self.query('SELECT msg_id, line FROM records '
+                          'WHERE run_id = ? AND file = ? ORDER BY seq', fname).fetchall()
+        if not rows:
+            raise KeyError(fname)
+
+        ## Same counting as 'File' so dict orders match too.
+        mtype2cnt = {}
+        line2msg = {}
+        for msgid, line in rows:
+            mtype = cmn.getMsgTypeByID(msgid)
+            mtype2cnt[mtype] = mtype2cnt.get(mtype, 0) + 1
+            line2msg[line] = line2msg.get(line, 0) + 1
+        return mtype2cnt, len(rows), sorted(line2msg.iteritems())
+
+    def get_records_by_line_range(self, fname, first, last):
+        return self.query('SELECT line, msg_id, desc FROM records '
+                          'WHERE run_id = ? AND file = ? AND line BETWEEN ? AND ? '
+                          'ORDER BY line, seq', fname, first, last).fetchall()
+
+    def get_dir_tree(self):
+        if self.dir_tree is None:
+            tree = DirTree()
+            for f, msgid, cnt in self.query('SELECT file, msg_id, COUNT(*) FROM records '
+                                            'WHERE run_id = ? GROUP BY msg_id, file'):
+                tree.add(f, msgid, cnt)
+            self.dir_tree = tree
+        return self.dir_tree
+
+    ## End of interface for file.
+
+    ## Interface for ranking hotspots, see 'LintResult'. Rows are
+    ## streamed from SQLite and ranked the same way.
+
+    def get_top_files(self, k, mtype=None):
+        return cmn.topK(k, self.query_by_type('SELECT file, COUNT(*) FROM records',
+                                              mtype, 'file'),
+                        key=cmn.fileCountKey)
+
+    def get_top_lines(self, k, mtype=None):
+        return cmn.topK(k, self.query_by_type('SELECT file, line, COUNT(DISTINCT msg_id), '
+                                              'COUNT(*) FROM records', mtype, 'file, line'),
+                        key=cmn.lineCountKey)
+
+    def get_top_density(self, k, mtype=None):
+        return cmn.topDensity(k, self.query_by_type('SELECT file, COUNT(*), MAX(line) '
+                                                    'FROM records', mtype, 'file'))
+
+    ## End of interface for ranking hotspots.
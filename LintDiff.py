@@ -0,0 +1,487 @@
+#!/usr/bin/env python
+
+"""
+Module for comparing two lint outputs message by message,
+telling which messages have been introduced and which fixed.
+"""
+
+import os
+import re
+import zlib
+import cPickle
+from array import array
+from operator import itemgetter
+from bisect import bisect_left, bisect_right
+from itertools import izip, count
+from collections import defaultdict
+import common as cmn
+
+## Bump it whenever the layout of the source hash cache changes.
+SRCHASH_VERSION = 1
+
+## How many lines a message may drift and still match.
+MAX_DRIFT = 50
+
+## Message ids are below it, to pack them into fingerprints.
+MSG_SPAN = len(cmn.msgid2type)
+
+## How many records of both results are compared at once
+## when they start the same.
+SKIP_RUN = 64
+
+line_ref_re = re.compile(r'\bline [\d]+')
+
+def normalize_desc(desc):
+    """
+    Return 'desc' without the '[PC-Lint xxx]' marker, line number
+    references and redundant whitespace, so it doesn't change
+    when lines move.
+    """
+    ## The marker ends the description.
+    i = desc.rfind('[PC-Lint ')
+    if i >= 0:
+        desc = desc[:i]
+    if 'line ' in desc:
+        desc = line_ref_re.sub('line #', desc)
+    return ' '.join(desc.split())
+
+class SourceHashes(object):
+    """
+    class SourceHashes gives crc32 of every line of the source
+    files under 'cmn.src_path', whitespace stripped.
+
+    Hashes are cached in '<cache_dir>/srchash.dat' with the size
+    and mtime of each source file, and recomputed when they change.
+    """
+    def __init__(self, cache_dir='./cache'):
+        self.cache_file = os.path.join(cache_dir, 'srchash.dat')
+        ## Map source path to (size, mtime, array of line hashes).
+        self.path2hashes = {}
+        self.dirty = False
+        try:
+            os.mkdir(cache_dir)
+        except OSError:
+            pass
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.cache_file, 'rb') as f:
+                version, path2hashes = cPickle.load(f)
+        except (IOError, EOFError, ValueError, cPickle.UnpicklingError):
+            return
+        if version != SRCHASH_VERSION:
+            return
+        for path, (size, mtime, hashes) in path2hashes.iteritems():
+            self.path2hashes[path] = (size, mtime, array('l', hashes))
+
+    def save(self):
+        if not self.dirty:
+            return
+        state = dict((path, (size, mtime, hashes.tostring()))
+                     for path, (size, mtime, hashes) in self.path2hashes.iteritems())
+        tmp = self.cache_file + '.tmp'
+        with open(tmp, 'wb') as f:
+            cPickle.dump((SRCHASH_VERSION, state), f, cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, self.cache_file)
+        self.dirty = False
+
+    def get_hashes(self, fname):
+        """
+        Return the array of line hashes of source file 'fname',
+        or None if it can't be read.
+        """
+        path = os.path.join(cmn.src_path, fname)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        cached = self.path2hashes.get(path)
+        if cached is not None and cached[:2] == (st.st_size, st.st_mtime):
+            return cached[2]
+
+        try:
+            with open(path, 'rb') as f:
+                hashes = array('l', [zlib.crc32(line.strip()) for line in f])
+        except IOError:
+            return None
+        self.path2hashes[path] = (st.st_size, st.st_mtime, hashes)
+        self.dirty = True
+        return hashes
+
+class LintDiff(object):
+    """
+    class LintDiff matches the records of an old and a new
+    'LintResult' one to one.
+
+    A record is fingerprinted by (message_id, file, normalized
+    description) plus the hashes of its source line and the lines
+    around it. Records are matched in two passes:
+    1. Same fingerprint and same source context.
+    2. Same fingerprint, nearest line within 'MAX_DRIFT' lines.
+    Records left in the new result are new messages, records
+    left in the old result are fixed ones.
+
+    File names and normalized descriptions of both results are
+    interned so a fingerprint is packed into one integer. Each pass
+    sorts the packed values of both results and merges the two
+    sorted lists, records are only looked up for what is left.
+
+    Methods used internally:
+    1. get_keys(self, lintres, fname2id, norm2id)
+    2. get_contexts(self, lintres, recs, ctx2id)
+    3. count_runs(self, values, start, end, counts)
+    4. pick_indexes(self, values, counts, last=False)
+    5. match_context(self, okeys, octxs, nkeys, nctxs)
+    6. pair_nearest(self, olds, news)
+    7. match_nearest(self, okeys, olines, nkeys, nlines)
+    8. to_messages(self, lintres, recs)
+    """
+    def __init__(self, old_lintres, new_lintres, srchashes=None):
+        self.ores = old_lintres
+        self.nres = new_lintres
+        self.srchashes = srchashes
+        self.new = []
+        self.fixed = []
+
+    ## Internal methods
+
+    def get_keys(self, lintres, fname2id, norm2id):
+        """
+        Return (records, fingerprints) of 'lintres' in output order.
+        A fingerprint is (normalized description, message_id, file)
+        packed into an integer with the ids of 'norm2id' and 'fname2id',
+        'fname2id' must already have every file name of 'lintres'.
+        """
+        store = lintres.store
+        nfiles = len(fname2id)
+        fids = [fname2id[fname] for fname in store.fnames]
+        msg_ids = store.msg_ids
+        file_ids = store.file_ids
+        recs = lintres.get_recs()
+        ## Normalize each distinct description once, they are
+        ## interned unless the store is memory mapped.
+        if store.src is None:
+            nids = [norm2id.setdefault(normalize_desc(desc), len(norm2id))
+                    for desc in store.descs]
+            desc_ids = store.desc_ids
+            keys = [(nids[desc_ids[rec]] * MSG_SPAN + msg_ids[rec]) * nfiles +
+                    fids[file_ids[rec]] for rec in recs]
+        else:
+            desc2nid = {}
+            keys = []
+            for rec in recs:
+                desc = store.desc(rec)
+                nid = desc2nid.get(desc)
+                if nid is None:
+                    nid = desc2nid[desc] = norm2id.setdefault(normalize_desc(desc),
+                                                              len(norm2id))
+                keys.append((nid * MSG_SPAN + msg_ids[rec]) * nfiles +
+                            fids[file_ids[rec]])
+        return recs, keys
+
+    def get_contexts(self, lintres, recs, ctx2id):
+        """
+        Return the source context of each record of 'recs': the
+        hashes of its line and the lines around it, interned in
+        'ctx2id', or -1 if the source can't be read. 'ctx2id' gives
+        a new id to a context it doesn't have.
+        """
+        store = lintres.store
+        fnames = store.fnames
+        file_ids = store.file_ids
+        lines = store.lines
+        ## Hashes of each file as a string, contexts are slices of it.
+        fid2src = [None] * len(fnames)
+        size = array('l').itemsize
+        ctxs = []
+        append = ctxs.append
+        for rec in recs:
+            fid = file_ids[rec]
+            src = fid2src[fid]
+            if src is None:
+                hashes = self.srchashes.get_hashes(fnames[fid])
+                src = fid2src[fid] = '' if hashes is None else hashes.tostring()
+            end = (lines[rec] + 1) * size
+            ## Lines are numbered from 1, take the line and its neighbours.
+            if size < end <= len(src) + size:
+                append(ctx2id[src[max(end - 3 * size, 0) : end]])
+            else:
+                append(-1)
+        return ctxs
+
+    def count_runs(self, values, start, end, counts):
+        """
+        Set 'counts'[v] to the length of the run of each value v
+        of sorted 'values'[start:end].
+        """
+        i = start
+        while i < end:
+            value = values[i]
+            k = bisect_right(values, value, i, end)
+            counts[value] = k - i
+            i = k
+
+    def pick_indexes(self, values, counts, last=False):
+        """
+        Return the sorted indexes of 'counts'[v] items of each value
+        v of dict 'counts' in list 'values', the first ones in the
+        list or the last ones if 'last'.
+        """
+        cands = [i for i, value in enumerate(values) if value in counts]
+        if last:
+            cands.reverse()
+        counts = dict(counts)
+        picked = []
+        for i in cands:
+            value = values[i]
+            if counts[value]:
+                counts[value] -= 1
+                picked.append(i)
+        picked.sort()
+        return picked
+
+    def match_context(self, okeys, octxs, nkeys, nctxs):
+        """
+        Match records with the same fingerprint and source context.
+        Records are given by their index in the lists of fingerprints
+        'okeys', 'nkeys' and of contexts 'octxs', 'nctxs'. Return the
+        (unmatched_old, unmatched_new) indexes.
+        """
+        span = max(max(okeys or [0]), max(nkeys or [0])) + 1
+        ## Pack (context, fingerprint), records without source context
+        ## are negative and go straight to pass 2.
+        ofps = [ctx * span + key for key, ctx in izip(okeys, octxs)]
+        nfps = [ctx * span + key for key, ctx in izip(nkeys, nctxs)]
+        olds = sorted(ofps)
+        news = sorted(nfps)
+        no = len(olds)
+        nn = len(news)
+
+        ## Map packed value to how many of its records are left.
+        left_old = {}
+        left_new = {}
+        i = bisect_left(olds, 0)
+        j = bisect_left(news, 0)
+        self.count_runs(olds, 0, i, left_old)
+        self.count_runs(news, 0, j, left_new)
+        while i < no and j < nn:
+            fp = olds[i]
+            nfp = news[j]
+            i2 = i + 1
+            j2 = j + 1
+            if fp == nfp:
+                if i2 < no and j2 < nn and olds[i2] == news[j2]:
+                    ## Records left unchanged come in runs, skip equal runs.
+                    run = olds[i : i + SKIP_RUN]
+                    if run == news[j : j + SKIP_RUN]:
+                        i += len(run)
+                        j += len(run)
+                        continue
+                if i2 < no and olds[i2] == fp:
+                    i2 = bisect_right(olds, fp, i2)
+                if j2 < nn and news[j2] == fp:
+                    j2 = bisect_right(news, fp, j2)
+                if i2 - i > j2 - j:
+                    left_old[fp] = (i2 - i) - (j2 - j)
+                elif j2 - j > i2 - i:
+                    left_new[fp] = (j2 - j) - (i2 - i)
+                i = i2
+                j = j2
+            elif fp < nfp:
+                if i2 < no and olds[i2] == fp:
+                    i2 = bisect_right(olds, fp, i2)
+                left_old[fp] = i2 - i
+                i = i2
+            else:
+                if j2 < nn and news[j2] == nfp:
+                    j2 = bisect_right(news, nfp, j2)
+                left_new[nfp] = j2 - j
+                j = j2
+        self.count_runs(olds, i, no, left_old)
+        self.count_runs(news, j, nn, left_new)
+
+        ## Same as matching the first new records of a group with
+        ## the last old ones, like popping them from a bucket.
+        return (self.pick_indexes(ofps, left_old),
+                self.pick_indexes(nfps, left_new, last=True))
+
+    def pair_nearest(self, olds, news):
+        """
+        Pair sorted values 'olds' and 'news' within 'MAX_DRIFT' of
+        each other, nearest pairs first. Return the (unpaired_old,
+        unpaired_new) values.
+        """
+        pairs = []
+        for i, oval in enumerate(olds):
+            lo = bisect_left(news, oval - MAX_DRIFT)
+            hi = bisect_right(news, oval + MAX_DRIFT)
+            pairs.extend((abs(news[j] - oval), i, j) for j in xrange(lo, hi))
+        pairs.sort()
+        oused = [False] * len(olds)
+        nused = [False] * len(news)
+        for dist, i, j in pairs:
+            if not oused[i] and not nused[j]:
+                oused[i] = nused[j] = True
+        return ([oval for oval, used in izip(olds, oused) if not used],
+                [nval for nval, used in izip(news, nused) if not used])
+
+    def match_nearest(self, okeys, olines, nkeys, nlines):
+        """
+        Match records with the same fingerprint by nearest line.
+        Records are given by their index in the lists of fingerprints
+        'okeys', 'nkeys' and of line numbers 'olines', 'nlines'.
+        Return the (unmatched_old, unmatched_new) indexes.
+
+        Both sides are sorted by (fingerprint, line#), so one merge
+        walks every group of fingerprints. An old and a new record
+        within 'MAX_DRIFT' lines are paired right away when neither
+        has another record in reach, otherwise the rest of their
+        group is paired by 'pair_nearest'.
+        """
+        span = max(max(olines or [0]), max(nlines or [0])) + MAX_DRIFT + 1
+        ## Pack (fingerprint, line#), a drift within 'MAX_DRIFT'
+        ## can't cross into another fingerprint.
+        ovals = [key * span + line for key, line in izip(okeys, olines)]
+        nvals = [key * span + line for key, line in izip(nkeys, nlines)]
+        olds = sorted(ovals)
+        news = sorted(nvals)
+        no = len(olds)
+        nn = len(news)
+
+        ## Map packed value to how many of its records are left.
+        left_old = {}
+        left_new = {}
+        i = j = 0
+        while i < no and j < nn:
+            oval = olds[i]
+            nval = news[j]
+            if oval == nval:
+                ## Records left unchanged come in runs, equal runs
+                ## match pairwise.
+                if i + 1 < no and j + 1 < nn and olds[i + 1] == news[j + 1]:
+                    run = olds[i : i + SKIP_RUN]
+                    if run == news[j : j + SKIP_RUN]:
+                        i += len(run)
+                        j += len(run)
+                        continue
+                i += 1
+                j += 1
+            elif oval - MAX_DRIFT <= nval <= oval + MAX_DRIFT:
+                if (i + 1 < no and olds[i + 1] <= nval + MAX_DRIFT) or \
+                        (j + 1 < nn and news[j + 1] <= oval + MAX_DRIFT):
+                    ## More than one way to pair them, pair the rest
+                    ## of the fingerprint group nearest first.
+                    bound = (oval // span + 1) * span
+                    i2 = bisect_left(olds, bound, i)
+                    j2 = bisect_left(news, bound, j)
+                    fixed, new = self.pair_nearest(olds[i:i2], news[j:j2])
+                    for oval in fixed:
+                        left_old[oval] = left_old.get(oval, 0) + 1
+                    for nval in new:
+                        left_new[nval] = left_new.get(nval, 0) + 1
+                    i = i2
+                    j = j2
+                else:
+                    i += 1
+                    j += 1
+            elif oval < nval:
+                left_old[oval] = left_old.get(oval, 0) + 1
+                i += 1
+            else:
+                left_new[nval] = left_new.get(nval, 0) + 1
+                j += 1
+        for oval in olds[i:]:
+            left_old[oval] = left_old.get(oval, 0) + 1
+        for nval in news[j:]:
+            left_new[nval] = left_new.get(nval, 0) + 1
+
+        ## Records with the same value only differ by the line
+        ## references of their description, any of them will do.
+        return self.pick_indexes(ovals, left_old), self.pick_indexes(nvals, left_new)
+
+    def to_messages(self, lintres, recs):
+        """
+        Return [(message_id, file, line#, description)] of records
+        'recs', sorted by file and line#.
+        """
+        store = lintres.store
+        recs = sorted(recs)
+        msgs = [(store.msg_ids[rec], store.fnames[store.file_ids[rec]],
+                 store.lines[rec], store.desc(rec)) for rec in recs]
+        msgs.sort(key=itemgetter(1, 2, 0))
+        return msgs
+
+    ## End of internal methods.
+
+    def diff(self):
+        """
+        Match old and new records, fill and return
+        (new_messages, fixed_messages).
+        """
+        fname2id = {}
+        for lintres in (self.ores, self.nres):
+            lintres.materialize_all()
+            for fname in lintres.store.fnames:
+                fname2id.setdefault(fname, len(fname2id))
+        norm2id = {}
+        orecs, okeys = self.get_keys(self.ores, fname2id, norm2id)
+        nrecs, nkeys = self.get_keys(self.nres, fname2id, norm2id)
+
+        ## Pass 1: exact fingerprint and source context.
+        if self.srchashes is not None:
+            ctx2id = defaultdict(count().next)
+            left_old, left_new = self.match_context(
+                okeys, self.get_contexts(self.ores, orecs, ctx2id),
+                nkeys, self.get_contexts(self.nres, nrecs, ctx2id))
+            del ctx2id
+            self.srchashes.save()
+            okeys = [okeys[i] for i in left_old]
+            orecs = [orecs[i] for i in left_old]
+            nkeys = [nkeys[j] for j in left_new]
+            nrecs = [nrecs[j] for j in left_new]
+
+        ## Pass 2: nearest line for whatever has drifted.
+        olines = self.ores.store.lines
+        nlines = self.nres.store.lines
+        fixed, new = self.match_nearest(okeys, [olines[rec] for rec in orecs],
+                                        nkeys, [nlines[rec] for rec in nrecs])
+        fixed = [orecs[i] for i in fixed]
+        new = [nrecs[j] for j in new]
+
+        self.new = self.to_messages(self.nres, new)
+        self.fixed = self.to_messages(self.ores, fixed)
+        return self.new, self.fixed
+
+    def print_messages(self, out, title, msgs):
+        print >> out, title, len(msgs)
+        print >> out, 'Message ID'.ljust(12),
+        print >> out, 'File Name'.ljust(50),
+        print >> out, 'Line number'.ljust(12),
+        print >> out, 'Description'
+        print >> out, '-' * 110
+        for msgid, fname, line, desc in msgs:
+            print >> out, str(msgid).ljust(12),
+            print >> out, fname.ljust(50),
+            print >> out, str(line).ljust(12),
+            print >> out, desc.strip()
+        print >> out
+
+    def report(self):
+        """
+        Write the new and fixed messages to a report file.
+        """
+        self.diff()
+        fn = 'diff_report_'+self.ores.get_fname_suffix()+\
+            '_'+self.nres.get_fname_suffix()+'.txt'
+        with open(os.path.join('./report', fn), 'w') as out:
+            print >> out, '+' * 40
+            print >> out, 'Lint message diff report.'
+            print >> out, '+' * 40
+            print >> out
+            self.print_messages(out, 'New messages:', self.new)
+            self.print_messages(out, 'Fixed messages:', self.fixed)
+
+        print '\nDiff report %s has been generated.' % (fn)
+        print
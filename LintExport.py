@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+
+"""
+Module for exporting processed lint results in machine readable
+formats: JSON Lines, CSV and a compact length-prefixed binary.
+Rows are generated and written in chunks, so an export never
+holds the whole serialized output in memory.
+"""
+
+import os
+import csv
+import json
+import struct
+from itertools import islice
+import common as cmn
+
+## Number of rows serialized per write.
+CHUNK_ROWS = 10000
+
+## Buffer size of the export files.
+BUFSIZE = 1 << 20
+
+FORMATS = ('jsonl', 'csv', 'bin')
+
+## What can be exported and the fields of its rows, as (name, kind)
+## where kind is 'i' for integers, 'f' for floats and 's' for strings.
+## The 'files' rows also have a count field per message type.
+KINDS = ('records', 'types', 'ids', 'files')
+FIELDS = {
+    'records' : [('msg_id', 'i'), ('type', 's'), ('file', 's'),
+                 ('line', 'i'), ('desc', 's')],
+    'types' : [('type', 's'), ('count', 'i'), ('prob', 'f')],
+    'ids' : [('msg_id', 'i'), ('type', 's'), ('count', 'i'), ('prob', 'f')],
+    'files' : [('file', 's'), ('total', 'i')],
+}
+
+## Binary format: 'MAGIC', the number of fields, then for each field
+## its kind and its '<H' length prefixed name. Each row is a '<I'
+## length prefixed payload of its fields: '<i' integers, '<d' floats
+## and strings. A string is a '<i' n, the n-th distinct string of the
+## stream if n >= 0, else a new string of -n-1 bytes that follow.
+MAGIC = 'LINTEXP1'
+
+def to_text(s):
+    """
+    Return str 's' as unicode for JSON, lint output is
+    supposed to be UTF-8 but may be anything.
+    """
+    return s.decode('utf-8', 'replace')
+
+class LintExport(object):
+    """
+    class LintExport writes the records and aggregates of a
+    processed result: a 'LintResult' or anything with its
+    query interface.
+
+    1. 'records'
+       Every record, in the order they appear in the output.
+    2. 'types'
+       The counts of 'get_msg_count_prob_by_type'.
+    3. 'ids'
+       The count of each message id, sorted by count in
+       decending order like 'LintResult.id_count_prob'.
+    4. 'files'
+       The total count and the count of each message type of
+       every file, sorted by file name.
+
+    Methods used internally:
+    1. iter_rows(self, kind)
+    2. write_jsonl(self, out, fields, rows)
+    3. write_csv(self, out, fields, rows)
+    4. write_bin(self, out, fields, rows)
+    """
+    def __init__(self, lintres):
+        self.lintres = lintres
+        self.mtypes = sorted(cmn.getMsgTypes(), reverse=True)
+
+    ## Internal methods
+
+    def iter_rows(self, kind):
+        lintres = self.lintres
+        if kind == 'records':
+            msgid2type = cmn.msgid2type
+            for msg_id, fname, line, desc in lintres.iter_records():
+                yield msg_id, msgid2type[msg_id], fname, line, desc
+        elif kind == 'types':
+            for row in lintres.get_msg_count_prob_by_type():
+                yield row
+        elif kind == 'ids':
+            rows = []
+            for mtype in self.mtypes:
+                rows.extend((mid, mtype, cnt, prob) for mid, cnt, prob in
+                            lintres.get_msgid_count_prob_by_type(mtype))
+            rows.sort(key=lambda row : row[2], reverse=True)
+            for row in rows:
+                yield row
+        elif kind == 'files':
+            files = sorted(lintres.get_files_by_type('h') +
+                           lintres.get_files_by_type('c'))
+            for fname in files:
+                mtype2cnt, total, linenums = lintres.get_cnt_linenums_by_fname(fname)
+                yield (fname, total) + tuple(mtype2cnt.get(t, 0) for t in self.mtypes)
+        else:
+            raise ValueError('Unknown export kind %s' % (kind))
+
+    def iter_chunks(self, rows):
+        while True:
+            chunk = list(islice(rows, CHUNK_ROWS))
+            if not chunk:
+                break
+            yield chunk
+
+    def write_jsonl(self, out, fields, rows):
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+        ## Types, files and descriptions repeat, encode each once.
+        encoded = {}
+        def encode_str(s):
+            text = encoded.get(s)
+            if text is None:
+                text = encoded[s] = encode(to_text(s)).encode('utf-8')
+            return text
+
+        names = [json.dumps(name) for name, kind in fields]
+        convs = []
+        for name, kind in fields:
+            if kind == 's':
+                convs.append(encode_str)
+            elif kind == 'f':
+                convs.append(repr)
+            else:
+                convs.append(str)
+        items = zip(names, convs)
+
+        for chunk in self.iter_chunks(rows):
+            out.write(''.join(['{' + ', '.join([name + ': ' + conv(v)
+                                               for (name, conv), v in zip(items, row)])
+                               + '}\n' for row in chunk]))
+
+    def write_csv(self, out, fields, rows):
+        writer = csv.writer(out)
+        writer.writerow([name for name, kind in fields])
+        for chunk in self.iter_chunks(rows):
+            writer.writerows(chunk)
+
+    def write_bin(self, out, fields, rows):
+        header = [MAGIC, struct.pack('<H', len(fields))]
+        for name, kind in fields:
+            header.append(kind + struct.pack('<H', len(name)) + name)
+        out.write(''.join(header))
+
+        pack_int = struct.Struct('<i').pack
+        ## Map each string written to its packed reference.
+        str2ref = {}
+        def pack_str(v):
+            ref = str2ref.get(v)
+            if ref is None:
+                str2ref[v] = pack_int(len(str2ref))
+                return pack_int(-len(v) - 1) + v
+            return ref
+
+        packs = []
+        for name, kind in fields:
+            if kind == 's':
+                packs.append(pack_str)
+            elif kind == 'f':
+                packs.append(struct.Struct('<d').pack)
+            else:
+                packs.append(pack_int)
+
+        pack_len = struct.Struct('<I').pack
+        for chunk in self.iter_chunks(rows):
+            parts = []
+            for row in chunk:
+                payload = ''.join([pack(v) for pack, v in zip(packs, row)])
+                parts.append(pack_len(len(payload)))
+                parts.append(payload)
+            out.write(''.join(parts))
+
+    ## End of internal methods.
+
+    def get_fields(self, kind):
+        """
+        Return the [(name, kind)] fields of the rows of 'kind'.
+        """
+        fields = list(FIELDS[kind])
+        if kind == 'files':
+            fields.extend((mtype, 'i') for mtype in self.mtypes)
+        return fields
+
+    def write(self, kind, fmt, out):
+        """
+        Write the rows of 'kind' in format 'fmt' to file 'out'.
+        """
+        fields = self.get_fields(kind)
+        rows = self.iter_rows(kind)
+        if fmt == 'jsonl':
+            self.write_jsonl(out, fields, rows)
+        elif fmt == 'csv':
+            self.write_csv(out, fields, rows)
+        elif fmt == 'bin':
+            self.write_bin(out, fields, rows)
+        else:
+            raise ValueError('Unknown export format %s' % (fmt))
+
+    def export(self, out_dir, fmt, kinds=KINDS):
+        """
+        Write each of 'kinds' to '<out_dir>/<suffix>_<kind>.<fmt>'.
+        Return the paths written.
+        """
+        try:
+            os.mkdir(out_dir)
+        except OSError:
+            pass
+        paths = []
+        for kind in kinds:
+            path = os.path.join(out_dir, '%s_%s.%s'
+                                % (self.lintres.get_fname_suffix(), kind, fmt))
+            with open(path, 'wb', BUFSIZE) as out:
+                self.write(kind, fmt, out)
+            paths.append(path)
+        return paths
+
+def iter_bin(f):
+    """
+    Read a binary export from file 'f'.
+    Yield its [(name, kind)] fields, then each row as a tuple.
+    """
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError('Not a lint export')
+    nfields, = struct.unpack('<H', f.read(2))
+    fields = []
+    for i in range(nfields):
+        kind = f.read(1)
+        nlen, = struct.unpack('<H', f.read(2))
+        fields.append((f.read(nlen), kind))
+    yield fields
+
+    strs = []
+    while True:
+        head = f.read(4)
+        if not head:
+            break
+        payload = f.read(struct.unpack('<I', head)[0])
+        row = []
+        pos = 0
+        for name, kind in fields:
+            if kind == 'f':
+                row.append(struct.unpack_from('<d', payload, pos)[0])
+                pos += 8
+                continue
+            n, = struct.unpack_from('<i', payload, pos)
+            pos += 4
+            if kind != 's':
+                row.append(n)
+            elif n >= 0:
+                row.append(strs[n])
+            else:
+                strs.append(payload[pos : pos - n - 1])
+                row.append(strs[-1])
+                pos += -n - 1
+        yield tuple(row)
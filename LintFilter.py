@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+
+"""
+Module for selecting the records of a lint result with a
+filter expression, such as:
+
+  type=Warnings and id in (525,534) and file~'drivers/*' and line<500
+
+A term compares a field with a value. The fields are 'type', 'id',
+'file', 'line' and 'desc'. The operators are '=', '!=', '<', '<=',
+'>', '>=', 'in (value, ...)' and '~', which matches a glob pattern
+of 'fnmatch' where '*' also matches '/'. 'id' and 'line' compare
+as numbers and don't take '~', the other fields compare as strings
+and only take '=', '!=', 'in' and '~'. Terms combine with 'and',
+'or', 'not' and parentheses. Values are numbers, bare words or
+quoted strings.
+"""
+
+import re
+import fnmatch
+from array import array
+from itertools import izip, count
+import common as cmn
+
+token_re = re.compile(r"""\s*(?:'([^']*)'|"([^"]*)"|(<=|>=|!=|[=<>~(),])|([^\s=!<>~(),'"]+))""")
+
+FIELDS = ('type', 'id', 'file', 'line', 'desc')
+## Fields compared as numbers.
+NUMERIC = ('id', 'line')
+KEYWORDS = ('and', 'or', 'not', 'in')
+CMP_OPS = ('=', '!=', '<', '<=', '>', '>=', '~')
+
+## Variable of the column of each field in compiled code.
+## Message types are tested on the message id.
+field2var = {'type' : 'm', 'id' : 'm', 'file' : 'f', 'line' : 'l', 'desc' : 'd'}
+## Name of the store column of each variable.
+var2col = {'m' : 'M', 'f' : 'F', 'l' : 'L', 'd' : 'D'}
+
+## A term is looked up in an index instead of scanning all
+## records when it selects at most this fraction of them.
+INDEX_RATIO = 0.5
+
+def tokenize(expr):
+    """
+    Return the tokens of 'expr' as (kind, value) tuples, 'kind' is
+    'op' for operators and parentheses, 'word' for bare words and
+    'str' for quoted strings.
+    """
+    tokens = []
+    expr = expr.rstrip()
+    pos = 0
+    while pos < len(expr):
+        m = token_re.match(expr, pos)
+        if m is None:
+            raise ValueError('Bad filter at: %s' % (expr[pos:]))
+        squoted, dquoted, op, word = m.groups()
+        if op is not None:
+            tokens.append(('op', op))
+        elif word is not None:
+            tokens.append(('word', word))
+        elif squoted is not None:
+            tokens.append(('str', squoted))
+        else:
+            tokens.append(('str', dquoted))
+        pos = m.end()
+    return tokens
+
+def glob_matcher(pattern):
+    return re.compile(fnmatch.translate(pattern)).match
+
+class LintFilter(object):
+    """
+    class LintFilter is a filter expression parsed into a tree
+    of nodes:
+    ('or', [node, ...]), ('and', [node, ...]), ('not', node) and
+    ('cmp', field, op, [value, ...]).
+
+    It is compiled for the store of a result into a single list
+    comprehension over the store columns. Values of strings are
+    resolved once against the interned file names and descriptions,
+    so a record is tested with integer comparisons and set lookups.
+    When a term of the top level 'and' is selective enough, the
+    records are taken from the message or file index of the result
+    instead of scanning them all.
+
+    Methods used internally:
+    1. next_token(self)
+    2. peek_keyword(self)
+    3. parse_or(self)
+    4. parse_and(self)
+    5. parse_not(self)
+    6. parse_cmp(self, field)
+    7. parse_value(self, field)
+    8. compile_node(self, node, store, consts)
+    9. compile_cmp(self, node, store, consts)
+    10. compile(self, store, with_recs)
+    11. index_lookup(self, node, lintres)
+    12. get_candidates(self, lintres, nrecs)
+    """
+    def __init__(self, expr):
+        self.expr = expr
+        self.tokens = tokenize(expr)
+        self.pos = 0
+        if not self.tokens:
+            raise ValueError('Empty filter')
+        self.tree = self.parse_or()
+        if self.pos < len(self.tokens):
+            raise ValueError('Unexpected %s in filter' % (self.tokens[self.pos][1]))
+
+    ## Internal methods
+
+    def next_token(self):
+        if self.pos >= len(self.tokens):
+            raise ValueError('Unexpected end of filter')
+        self.pos += 1
+        return self.tokens[self.pos - 1]
+
+    def peek_keyword(self):
+        if self.pos < len(self.tokens):
+            kind, value = self.tokens[self.pos]
+            if kind == 'word' and value.lower() in KEYWORDS:
+                return value.lower()
+        return None
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.peek_keyword() == 'or':
+            self.pos += 1
+            nodes.append(self.parse_and())
+        if len(nodes) == 1:
+            return nodes[0]
+        return ('or', nodes)
+
+    def parse_and(self):
+        nodes = [self.parse_not()]
+        while self.peek_keyword() == 'and':
+            self.pos += 1
+            nodes.append(self.parse_not())
+        if len(nodes) == 1:
+            return nodes[0]
+        return ('and', nodes)
+
+    def parse_not(self):
+        if self.peek_keyword() == 'not':
+            self.pos += 1
+            return ('not', self.parse_not())
+
+        kind, value = self.next_token()
+        if (kind, value) == ('op', '('):
+            node = self.parse_or()
+            if self.next_token() != ('op', ')'):
+                raise ValueError('Missing ) in filter')
+            return node
+        if kind != 'word' or value.lower() not in FIELDS:
+            raise ValueError('Unknown field %s in filter' % (value))
+        return self.parse_cmp(value.lower())
+
+    def parse_cmp(self, field):
+        kind, op = self.next_token()
+        if kind == 'word' and op.lower() == 'in':
+            if self.next_token() != ('op', '('):
+                raise ValueError('Missing ( after in')
+            values = [self.parse_value(field)]
+            while True:
+                kind, value = self.next_token()
+                if value == ')' and kind == 'op':
+                    break
+                if value != ',' or kind != 'op':
+                    raise ValueError('Missing , or ) in filter')
+                values.append(self.parse_value(field))
+            return ('cmp', field, 'in', values)
+
+        if kind != 'op' or op not in CMP_OPS:
+            raise ValueError('Unknown operator %s in filter' % (op))
+        if field in NUMERIC and op == '~':
+            raise ValueError('%s can\'t be matched with ~' % (field))
+        if field not in NUMERIC and op not in ('=', '!=', '~'):
+            raise ValueError('%s can\'t be compared with %s' % (field, op))
+        if op == '~':
+            kind, value = self.next_token()
+            if kind == 'op':
+                raise ValueError('Missing pattern of %s' % (field))
+        else:
+            value = self.parse_value(field)
+        return ('cmp', field, op, [value])
+
+    def parse_value(self, field):
+        kind, value = self.next_token()
+        if kind == 'op':
+            raise ValueError('Missing value of %s' % (field))
+        if field in NUMERIC:
+            try:
+                return int(value)
+            except ValueError:
+                raise ValueError('%s needs a number, not %s' % (field, value))
+        if field == 'type' and value not in cmn.mtype2range:
+            raise ValueError('Unknown message type %s' % (value))
+        return value
+
+    def compile_node(self, node, store, consts):
+        """
+        Return the Python expression of 'node'. The columns of a
+        record are the variables '{m}', '{f}', '{l}' and '{d}',
+        '{r}' is the record. Constants are appended to 'consts'
+        and named 'k<index>'.
+        """
+        if node[0] == 'cmp':
+            return self.compile_cmp(node, store, consts)
+        if node[0] == 'not':
+            return '(not %s)' % (self.compile_node(node[1], store, consts))
+        return '(%s)' % ((' %s ' % (node[0])).join(
+            [self.compile_node(n, store, consts) for n in node[1]]))
+
+    def compile_cmp(self, node, store, consts):
+        cmp, field, op, values = node
+        var = '{%s}' % (field2var[field])
+        if field in NUMERIC:
+            if op == 'in':
+                consts.append(frozenset(values))
+                return '%s in k%d' % (var, len(consts) - 1)
+            return '%s %s %d' % (var, op == '=' and '==' or op, values[0])
+
+        ## Strings are matched against the table of their values.
+        if op == '~':
+            matches = glob_matcher(values[0])
+        else:
+            wanted = set(values)
+            matches = wanted.__contains__
+
+        if field == 'type':
+            msgids = set()
+            for mtype, (lo, hi) in cmn.mtype2range.iteritems():
+                if matches(mtype):
+                    msgids.update(xrange(lo, hi))
+            consts.append(frozenset(msgids))
+        elif field == 'file':
+            consts.append(frozenset(fid for fid, fname in enumerate(store.fnames)
+                                    if matches(fname)))
+        elif store.src is None:
+            consts.append(frozenset(did for did, desc in enumerate(store.descs)
+                                    if matches(desc)))
+        else:
+            ## Descriptions stay in the mapping, read them
+            ## only for records that pass the other terms.
+            consts.append(matches)
+            test = 'k%d(S({r}))' % (len(consts) - 1)
+            return op == '!=' and '(not %s)' % (test) or test
+
+        if op == '!=':
+            return '%s not in k%d' % (var, len(consts) - 1)
+        return '%s in k%d' % (var, len(consts) - 1)
+
+    def compile(self, store, with_recs):
+        """
+        Return a function selecting the records matching the filter.
+        If 'with_recs' it takes the records to test, otherwise it
+        takes no argument and scans the whole store.
+        """
+        consts = []
+        expr = self.compile_node(self.tree, store, consts)
+        env = dict(('k%d' % i, c) for i, c in enumerate(consts))
+        env.update(izip=izip, count=count, array=array, S=store.desc,
+                   M=store.msg_ids, F=store.file_ids, L=store.lines,
+                   D=store.desc_ids)
+
+        if with_recs:
+            names = dict((var, '%s[r]' % col) for var, col in var2col.iteritems())
+            names['r'] = 'r'
+            code = 'lambda R: array("i", [r for r in R if %s])' % (expr.format(**names))
+        else:
+            ## Only zip the columns in use.
+            used = [var for var in 'mfld' if '{%s}' % var in expr]
+            names = dict((var, var) for var in used)
+            names['r'] = 'r'
+            if used:
+                code = 'lambda: array("i", [r for r, %s in izip(count(), %s) if %s])' \
+                    % (', '.join(used), ', '.join([var2col[var] for var in used]),
+                       expr.format(**names))
+            else:
+                code = 'lambda: array("i", [r for r in xrange(len(M)) if %s])' \
+                    % (expr.format(**names))
+        return eval(code, env)
+
+    def index_lookup(self, node, lintres):
+        """
+        Return (count, [array of records]) of the records that
+        term 'node' selects, from the message or file index of
+        'lintres'. Return None if the term can't use an index.
+        """
+        cmp, field, op, values = node
+        if op not in ('=', 'in', '~') or field not in ('id', 'type', 'file'):
+            return None
+        if op == '~':
+            matches = glob_matcher(values[0])
+        else:
+            matches = set(values).__contains__
+
+        if field == 'file':
+            files = [f for fname, f in lintres.files.iteritems() if matches(fname)]
+            return sum(len(f.recs) for f in files), [f.recs for f in files]
+
+        if field == 'id':
+            msgids = [v for v in values if lintres.has_msg(v)]
+        else:
+            msgids = [mid for mtype in cmn.mtype2range if matches(mtype)
+                      for mid, cnt, prob in lintres.get_msgid_count_prob_by_type(mtype)]
+        msgs = [lintres.get_msg(mid) for mid in msgids]
+        return (sum(msg.get_total() for msg in msgs),
+                [recs for msg in msgs for recs in msg.file2recs.itervalues()])
+
+    def get_candidates(self, lintres, nrecs):
+        """
+        Return the sorted array of records selected by the most
+        selective indexed term of the top level 'and' of the filter,
+        or None if no term selects few enough of the 'nrecs' records.
+        """
+        if self.tree[0] == 'and':
+            nodes = self.tree[1]
+        else:
+            nodes = [self.tree]
+
+        best = None
+        for node in nodes:
+            if node[0] != 'cmp':
+                continue
+            found = self.index_lookup(node, lintres)
+            if found is not None and (best is None or found[0] < best[0]):
+                best = found
+        if best is None or best[0] > nrecs * INDEX_RATIO:
+            return None
+
+        if len(best[1]) == 1:
+            return best[1][0]
+        recs = array('i')
+        for part in best[1]:
+            recs.extend(part)
+        return array('i', sorted(recs))
+
+    ## End of internal methods.
+
+    def match_records(self, lintres):
+        """
+        Return the sorted array of the records of processed
+        'lintres' matching the filter.
+        """
+        if not hasattr(lintres, 'store'):
+            raise TypeError('Filtering needs a parsed lint output')
+        lintres.materialize_all()
+        store = lintres.store
+        recs = lintres.get_recs()
+        cands = self.get_candidates(lintres, len(recs))
+        if cands is not None:
+            return self.compile(store, True)(cands)
+        if lintres.recs is not None:
+            return self.compile(store, True)(recs)
+        return self.compile(store, False)()
+
+    def apply(self, lintres):
+        """
+        Return a 'LintResult' of the records of processed
+        'lintres' matching the filter, see 'LintResult.select'.
+        """
+        return lintres.select(self.match_records(lintres))
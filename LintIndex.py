@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+"""
+Module for searching the descriptions of lint messages
+through an inverted index of their tokens.
+"""
+
+import re
+from bisect import bisect_left
+from array import array
+
+word_re = re.compile(r'[A-Za-z0-9_]+(?:\.[0-9]+)*')
+## Flexelint quotes the symbols it talks about: 'foo_bar'.
+symbol_re = re.compile(r"'([A-Za-z_][A-Za-z0-9_]*)'")
+
+## Prefix of symbol tokens, search 'sym:foo' for symbol 'foo'.
+SYMBOL = 'sym:'
+
+def tokenize(desc):
+    """
+    Return the set of tokens of description 'desc': its words in
+    lower case, and its quoted symbols prefixed with 'SYMBOL'.
+    The '[PC-Lint xxx]' marker is left out.
+    """
+    i = desc.rfind('[PC-Lint ')
+    if i >= 0:
+        desc = desc[:i]
+    tokens = set(w.lower() for w in word_re.findall(desc))
+    tokens.update(SYMBOL + s for s in symbol_re.findall(desc))
+    return tokens
+
+class DescIndex(object):
+    """
+    class DescIndex is an inverted index over the descriptions
+    of the records of a 'LintResult'.
+
+    Records are grouped by distinct description, so each distinct
+    description is tokenized once and a token costs a few bytes
+    per description it occurs in rather than per record.
+
+    Data Structure:
+    1. 'did_recs'
+       A list mapping description id to an array of its records.
+    2. 'token2dids'
+       A dict mapping token to the sorted array of ids of the
+       descriptions containing it.
+    3. 'tokens'
+       Sorted list of all tokens, for prefix lookups.
+
+    Methods used internally:
+    1. group_records(self, recs)
+    2. match_term(self, term)
+    """
+    def __init__(self, lintres):
+        lintres.materialize_all()
+        self.store = lintres.store
+        descs = self.group_records(lintres.get_recs())
+
+        self.token2dids = {}
+        for did, desc in enumerate(descs):
+            for token in tokenize(desc):
+                dids = self.token2dids.get(token)
+                if dids is None:
+                    dids = self.token2dids[token] = array('i')
+                dids.append(did)
+        self.tokens = sorted(self.token2dids)
+
+    ## Internal methods
+
+    def group_records(self, recs):
+        """
+        Fill 'did_recs' with records 'recs',
+        return the list of distinct descriptions.
+        """
+        store = self.store
+        if store.src is None:
+            ## Descriptions are interned already.
+            descs = store.descs
+            desc_ids = store.desc_ids
+            self.did_recs = [array('i') for desc in descs]
+            did_recs = self.did_recs
+            for rec in recs:
+                did_recs[desc_ids[rec]].append(rec)
+            return descs
+
+        descs = []
+        desc2id = {}
+        self.did_recs = []
+        did_recs = self.did_recs
+        for rec in recs:
+            desc = store.desc(rec)
+            did = desc2id.get(desc)
+            if did is None:
+                did = desc2id[desc] = len(descs)
+                descs.append(desc)
+                did_recs.append(array('i'))
+            did_recs[did].append(rec)
+        return descs
+
+    def match_term(self, term):
+        """
+        Return the set of description ids matching 'term',
+        a token or a prefix of tokens ending with '*'.
+        """
+        if not term.startswith(SYMBOL):
+            term = term.lower()
+        if not term.endswith('*'):
+            return set(self.token2dids.get(term, ()))
+
+        prefix = term[:-1]
+        dids = set()
+        i = bisect_left(self.tokens, prefix)
+        while i < len(self.tokens) and self.tokens[i].startswith(prefix):
+            dids.update(self.token2dids[self.tokens[i]])
+            i += 1
+        return dids
+
+    ## End of internal methods.
+
+    def search(self, query):
+        """
+        Return the sorted array of records whose description
+        contains every term of 'query'. A term is a word, a
+        'sym:<symbol>' or either of them ending with '*' to
+        match a prefix. Words match regardless of case.
+        """
+        terms = query.split()
+        if not terms:
+            return array('i')
+        dids = None
+        for term in terms:
+            matched = self.match_term(term)
+            dids = matched if dids is None else dids & matched
+            if not dids:
+                return array('i')
+
+        if len(dids) == 1:
+            return self.did_recs[dids.pop()]
+        recs = array('i')
+        for did in dids:
+            recs.extend(self.did_recs[did])
+        return array('i', sorted(recs))
+
+    def get_hits(self, recs):
+        """
+        Return [(message_id, file, line#)] of records 'recs'.
+        """
+        return get_hits(self.store, recs)
+
+def get_hits(store, recs):
+    """
+    Return [(message_id, file, line#)] of records 'recs' of 'store'.
+    """
+    fnames = store.fnames
+    return [(store.msg_ids[rec], fnames[store.file_ids[rec]], store.lines[rec])
+            for rec in recs]
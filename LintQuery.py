@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+
+"""
+Module for answering queries on a processed lint result in
+batch, one query per line, without the interactive console.
+
+Queries, blank lines and lines starting with '#' are skipped:
+  types                            counts and probabilities of message types
+  type <message_type>              message ids of the type with counts and probabilities
+  id <message_id>                  files with the message and their counts
+  id <message_id> <file>           line numbers and descriptions of the message in the file
+  files <h|c>                      header or c source files with messages
+  file <file>                      counts by message type and line number of the file
+  lines <file> <first> <last>      messages of the file on lines first to last
+  search <term> ...                messages whose description has all terms,
+                                   see 'DescIndex.search'
+  filter <expression>              messages matching the expression,
+                                   see 'LintFilter'
+  dir [<directory>]                counts of the directory and below it, by message
+                                   type and id, its subdirectories and files
+  top <files|lines|density> [<message_type>|all] [<k>]
+                                   the k (default 50) files with the most messages,
+                                   lines with the most distinct message ids or files
+                                   with the most messages per line
+"""
+
+import json
+import common as cmn
+from LintExport import to_text
+from LintIndex import DescIndex, get_hits
+from LintFilter import LintFilter
+
+## Most hits returned by a search or a filter, the count is always given.
+SEARCH_LIMIT = 1000
+
+## Default size of the rankings of 'top'.
+TOP_K = 50
+
+class Unsupported(Exception):
+    """
+    Raised by a query the processed result can't answer,
+    such as a search on a result stored in a database.
+    """
+    pass
+
+class LintQuery(object):
+    """
+    class LintQuery answers queries on a processed result: a
+    'LintResult' or anything with its query interface.
+
+    Each answer is written as one line of JSON as soon as it is
+    computed: {"query": ..., "result": ...} or {"query": ...,
+    "error": ...}. Once the result is loaded, a query costs a few
+    dict lookups plus the size of its answer. Counts of a file are
+    computed from its records, so they are memoized in 'file2counts'.
+
+    Methods used internally:
+    1. query_types(self, args)
+    2. query_type(self, args)
+    3. query_id(self, args)
+    4. query_files(self, args)
+    5. query_file(self, args)
+    6. query_lines(self, args)
+    7. query_search(self, args)
+    8. query_filter(self, args)
+    9. query_dir(self, args)
+    10. query_top(self, args)
+    """
+    def __init__(self, lintres):
+        self.lintres = lintres
+        self.file2counts = {}
+        self.desc_index = None
+        self.handlers = {'types' : self.query_types,
+                         'type' : self.query_type,
+                         'id' : self.query_id,
+                         'files' : self.query_files,
+                         'file' : self.query_file,
+                         'lines' : self.query_lines,
+                         'search' : self.query_search,
+                         'filter' : self.query_filter,
+                         'dir' : self.query_dir,
+                         'top' : self.query_top}
+
+    ## Internal methods
+
+    def query_types(self, args):
+        return self.lintres.get_msg_count_prob_by_type()
+
+    def query_id(self, args):
+        msgid = int(args[0])
+        if len(args) > 1:
+            return self.lintres.get_info_by_id_and_file(msgid, args[1])
+        if not self.lintres.has_msg(msgid):
+            raise KeyError(msgid)
+        hlist, clist = self.lintres.get_flist_by_id(msgid)
+        return hlist + clist
+
+    def query_files(self, args):
+        if args[0] not in ('h', 'c'):
+            raise ValueError(args[0])
+        return self.lintres.get_files_by_type(args[0])
+
+    def query_file(self, args):
+        counts = self.file2counts.get(args[0])
+        if counts is None:
+            mtype2cnt, total, linenums = self.lintres.get_cnt_linenums_by_fname(args[0])
+            counts = {'total' : total, 'types' : mtype2cnt, 'lines' : linenums}
+            self.file2counts[args[0]] = counts
+        return counts
+
+    def query_type(self, args):
+        return self.lintres.get_msgid_count_prob_by_type(args[0])
+
+    def query_lines(self, args):
+        return self.lintres.get_records_by_line_range(args[0], int(args[1]),
+                                                      int(args[2]))
+
+    def query_search(self, args):
+        recs = self.get_desc_index().search(' '.join(args))
+        return {'count' : len(recs),
+                'hits' : self.desc_index.get_hits(recs[:SEARCH_LIMIT])}
+
+    def query_filter(self, args):
+        if not hasattr(self.lintres, 'store'):
+            raise Unsupported('Filtering needs a parsed lint output')
+        recs = LintFilter(' '.join(args)).match_records(self.lintres)
+        return {'count' : len(recs),
+                'hits' : get_hits(self.lintres.store, recs[:SEARCH_LIMIT])}
+
+    def query_dir(self, args):
+        tree = self.lintres.get_dir_tree()
+        path = args[0] if args else ''
+        total, type2cnt, id2cnt = tree.get_counts(path)
+        return {'total' : total, 'types' : type2cnt,
+                'ids' : sorted(id2cnt.iteritems()),
+                'dirs' : tree.get_subdirs(path),
+                'files' : tree.get_files(path)}
+
+    def query_top(self, args):
+        rankings = {'files' : self.lintres.get_top_files,
+                    'lines' : self.lintres.get_top_lines,
+                    'density' : self.lintres.get_top_density}
+        if args[0] not in rankings:
+            raise ValueError(args[0])
+        mtype = None
+        if len(args) > 1 and args[1] != 'all':
+            mtype = args[1]
+            if mtype not in cmn.mtype2range:
+                raise KeyError(mtype)
+        k = TOP_K
+        if len(args) > 2:
+            k = int(args[2])
+        return rankings[args[0]](k, mtype)
+
+    ## End of internal methods.
+
+    def get_desc_index(self):
+        """
+        Return the 'DescIndex' of the result, building it on first use.
+        """
+        if self.desc_index is None:
+            if not hasattr(self.lintres, 'store'):
+                raise Unsupported('Search needs a parsed lint output')
+            self.desc_index = DescIndex(self.lintres)
+        return self.desc_index
+
+    def answer(self, query):
+        """
+        Return the answer of 'query' as a dict.
+        """
+        words = query.split()
+        return self.answer_words(query, words[0], words[1:])
+
+    def answer_words(self, query, kind, args):
+        """
+        Return the answer of 'query', already split into
+        its 'kind' and 'args', as a dict.
+        """
+        try:
+            handler = self.handlers[kind]
+        except KeyError:
+            return {'query' : query, 'error' : 'Unknown query'}
+        try:
+            return {'query' : query, 'result' : handler(args)}
+        except KeyError:
+            return {'query' : query, 'error' : 'Not found'}
+        except (IndexError, ValueError):
+            return {'query' : query, 'error' : 'Wrong arguments'}
+        except Unsupported:
+            return {'query' : query, 'error' : 'Not supported'}
+
+    def to_json(self, answer):
+        """
+        Return 'answer' as a line of JSON.
+        """
+        try:
+            return json.dumps(answer)
+        except UnicodeDecodeError:
+            ## Some text isn't UTF-8, decode it all the lenient way.
+            return json.dumps(decode_all(answer))
+
+    def run(self, fin, out):
+        """
+        Answer every query read from file 'fin', write the
+        answers to file 'out'. Return the number of queries.
+        """
+        nqueries = 0
+        for line in fin:
+            query = line.strip()
+            if not query or query.startswith('#'):
+                continue
+            out.write(self.to_json(self.answer(query)) + '\n')
+            nqueries += 1
+        return nqueries
+
+def decode_all(obj):
+    """
+    Return 'obj' with every str in it turned into unicode by 'to_text'.
+    """
+    if isinstance(obj, str):
+        return to_text(obj)
+    if isinstance(obj, (list, tuple)):
+        return [decode_all(o) for o in obj]
+    if isinstance(obj, dict):
+        return dict((decode_all(k), decode_all(v)) for k, v in obj.iteritems())
+    return obj
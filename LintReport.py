@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+
+"""
+Module for writing the per type lint reports. The text is
+built with string formatting and written through buffered
+files, byte for byte what the old print based reports gave.
+"""
+
+import os
+import sys
+import multiprocessing
+import common as cmn
+
+## Buffer size of the report files.
+BUFSIZE = 1 << 20
+
+## Levels of directories in the rollup section of a report.
+ROLLUP_DEPTH = 3
+## Row of the rollup for the files right in the source root.
+ROOT_FILES = '(files in root)'
+
+## Sizes of the rankings of the hotspot section of a report.
+TOP_FILES = 50
+TOP_LINES = 100
+
+## The format_* functions append the lines of a section to 'parts',
+## laid out like the print statements of the interactive console.
+
+def format_msg_cnt_prob_by_type(parts, total, raw_msg_cnt_prob):
+    parts.append('\nLint Messages counts and probabilities by message type:\n')
+    parts.append('\nMessage Type'.ljust(25) + ' ' + 'Count'.ljust(9) + ' ' +
+                 'Probability'.ljust(15) + '\n')
+    parts.append('-' * 46 + '\n')
+    for index, (msgtype, cnt, prob) in enumerate(raw_msg_cnt_prob):
+        parts.append('[%d] %s %s %s\n' % (index, str(msgtype).ljust(20),
+                                          str(cnt).ljust(9),
+                                          '{0:.1f}%'.format(float(prob) * 100).ljust(15)))
+    parts.append('-' * 46 + '\n')
+    parts.append('Total: %s\n\n' % (total))
+
+def format_msgid_cnt_prob_by_type(parts, mid_cnt_prob, mtype):
+    mrange = cmn.getRangeOfMsgType(mtype)
+    parts.append('\nMessage Type: %s \tRange of ID: %d to %d\n'
+                 % (mtype, mrange[0], mrange[1]-1))
+    parts.append('IDs found:\n\n')
+    parts.append('Message ID'.ljust(12) + ' ' + 'Count'.ljust(7) + ' ' +
+                 'Probability'.ljust(15) + '\n')
+    parts.append('-' * 32 + '\n')
+    for (msgid, cnt, prob) in mid_cnt_prob:
+        parts.append('%s %s %s\n' % (str(msgid).ljust(12), str(cnt).ljust(7),
+                                     '{0:.3f}%'.format(prob * 100).ljust(15)))
+    parts.append('-' * 32 + '\n')
+    parts.append('Number of distinct IDs: %d\n\n' % (len(mid_cnt_prob)))
+
+def format_flist_by_id(parts, msgid, hlist, clist):
+    parts.append('\n' + ''.rjust(25) + ' Message ID: %s\n' % (msgid))
+    parts.append('File Name'.ljust(56) + ' Count\n')
+    parts.append('-' * 65 + '\n')
+    findex = 0
+    for f, cnt in hlist + clist:
+        parts.append('[%d] %s\n' % (findex, '{0:48} ==> {1:3d}'.format(f, cnt)))
+        findex += 1
+
+def format_dir_rollup(parts, mtype, rows, total):
+    """
+    'rows' are the [(depth, directory, count)] of type 'mtype'
+    out of 'total', directories are indented by their depth.
+    """
+    parts.append('\nMessages of type %s by directory:\n\n' % (mtype))
+    parts.append('Directory'.ljust(48) + ' ' + 'Count'.ljust(9) + ' ' +
+                 'Share'.ljust(8) + '\n')
+    parts.append('-' * 67 + '\n')
+    for depth, path, cnt in rows:
+        parts.append('%s %s %s\n' % (('  ' * (depth - 1) + path).ljust(48),
+                                     str(cnt).ljust(9),
+                                     '{0:.1f}%'.format(cnt * 100.0 / total).ljust(8)))
+    parts.append('-' * 67 + '\n')
+    parts.append('Total: %d\n\n' % (total))
+
+def format_hotspots(parts, mtype, files, lines, density):
+    """
+    'files', 'lines' and 'density' are rankings of 'LintResult'
+    'get_top_files', 'get_top_lines' and 'get_top_density'.
+    """
+    parts.append('\nHotspots of type %s:\n' % (mtype))
+    parts.append('\nTop %d files by count:\n\n' % (len(files)))
+    parts.append('File Name'.ljust(56) + ' Count\n')
+    parts.append('-' * 65 + '\n')
+    for index, (f, cnt) in enumerate(files):
+        parts.append('[%d] %s\n' % (index, '{0:48} ==> {1:3d}'.format(f, cnt)))
+
+    parts.append('\nTop %d lines by distinct message IDs:\n\n' % (len(lines)))
+    parts.append('File Name:Line number'.ljust(56) + ' ' + 'IDs'.ljust(7) + ' Count\n')
+    parts.append('-' * 72 + '\n')
+    for index, (f, line, nids, cnt) in enumerate(lines):
+        parts.append('[%d] %s %s %d\n' % (index, ('%s:%d' % (f, line)).ljust(52),
+                                          str(nids).ljust(7), cnt))
+
+    parts.append('\nTop %d files by messages per line:\n\n' % (len(density)))
+    parts.append('File Name'.ljust(52) + ' ' + 'Count'.ljust(7) + ' ' +
+                 'Lines'.ljust(10) + ' Per line\n')
+    parts.append('-' * 80 + '\n')
+    for index, (f, cnt, nlines) in enumerate(density):
+        parts.append('[%d] %s %s %s %s\n' % (index, f.ljust(48), str(cnt).ljust(7),
+                                             str(nlines).ljust(10),
+                                             '{0:.3f}'.format(float(cnt) / nlines)))
+    parts.append('\n')
+
+def format_dir_info(parts, path, total, type2cnt, subdirs, files):
+    parts.append('\nDirectory: %s\n\n' % (path or '/'))
+    mtypes = sorted(type2cnt)
+    parts.append(''.join([mtype.ljust(15) + ' ' for mtype in mtypes]) +
+                 'Total'.ljust(10) + '\n')
+    parts.append('-' * 70 + '\n')
+    parts.append(''.join([str(type2cnt[mtype]).ljust(15) + ' ' for mtype in mtypes]) +
+                 str(total).ljust(10) + '\n')
+    parts.append('\n' + 'Directory or File Name'.ljust(56) + ' Count\n')
+    parts.append('-' * 65 + '\n')
+    findex = 0
+    for d, cnt in subdirs:
+        parts.append('[%d] %s\n' % (findex, '{0:48} ==> {1:3d}'.format(d + '/', cnt)))
+        findex += 1
+    for f, cnt in files:
+        parts.append('[%d] %s\n' % (findex, '{0:48} ==> {1:3d}'.format(f, cnt)))
+        findex += 1
+
+def format_file_info(parts, fname, finfo, desc2text=None):
+    """
+    'desc2text' memoizes 'format_desc', descriptions repeat a lot.
+    """
+    if desc2text is None:
+        desc2text = {}
+    parts.append('\nFile Name: %s\n' % (fname))
+    parts.append('Line number'.ljust(16) + ' Description\n')
+    parts.append('-' * 75 + '\n')
+    append = parts.append
+    for (linenum, desc) in finfo:
+        text = desc2text.get(desc)
+        if text is None:
+            text = desc2text[desc] = format_desc(desc)
+        append('%11d ==> %s' % (linenum, text))
+
+def format_desc(desc):
+    """
+    Return description 'desc' broken into lines of 50 characters,
+    the following lines indented, and a blank line.
+    """
+    indent = ''.rjust(16) + ' '
+    return ''.join([desc[0 : 50], '\n'] +
+                   [indent + desc[x : x+50] + '\n'
+                    for x in xrange(50, len(desc) + 1, 50)] +
+                   ['\n'])
+
+class LintReport(object):
+    """
+    class LintReport writes the reports of any number of message
+    types of a processed result: a 'LintResult' or anything with
+    its query interface.
+
+    The type summary is formatted once and each message id is
+    visited once. The text of a message id is joined and written
+    in one call, files are written through 'BUFSIZE' buffers.
+
+    With more than one worker the text of the message ids is
+    rendered by a pool of processes forked with this object,
+    so they share the processed result read-only, and written
+    in order.
+
+    Methods used internally:
+    1. report_path(self, mtype)
+    2. write_header(self, out, mtype, summary)
+    3. format_msgid(self, mid)
+    """
+    def __init__(self, lintres, report_dir='./report'):
+        self.lintres = lintres
+        self.report_dir = report_dir
+        self.desc2text = {}
+
+    ## Internal methods
+
+    def report_path(self, mtype):
+        fname = 'report_'+self.lintres.get_fname_suffix()+'_'+mtype+'.txt'
+        return os.path.join(self.report_dir, fname)
+
+    def write_header(self, out, mtype, summary):
+        msg_range = cmn.getRangeOfMsgType(mtype)
+        parts = ['+' * 50 + '\n',
+                 'Lint Report for DP600 Project.\n',
+                 'Message Type: %s. Range of Message ID:(%d~%d)\n'
+                 % (mtype, msg_range[0], msg_range[1]),
+                 '+' * 50 + '\n',
+                 summary]
+        mid_cnt_prob = self.lintres.get_msgid_count_prob_by_type(mtype)
+        format_msgid_cnt_prob_by_type(parts, mid_cnt_prob, mtype)
+
+        lintres = self.lintres
+        tree = lintres.get_dir_tree()
+        total = tree.root.type2cnt.get(mtype, 0)
+        if total:
+            rows = [(depth, node.path, node.type2cnt[mtype])
+                    for depth, node in tree.iter_dirs(ROLLUP_DEPTH)
+                    if node.type2cnt.get(mtype)]
+            ## Messages of the files right in the root are in no directory.
+            root_cnt = total - sum(child.type2cnt.get(mtype, 0)
+                                   for child in tree.root.children.itervalues())
+            if root_cnt:
+                rows.insert(0, (1, ROOT_FILES, root_cnt))
+            format_dir_rollup(parts, mtype, rows, total)
+            format_hotspots(parts, mtype, lintres.get_top_files(TOP_FILES, mtype),
+                            lintres.get_top_lines(TOP_LINES, mtype),
+                            lintres.get_top_density(TOP_FILES, mtype))
+        out.write(''.join(parts))
+        return [mid for mid, cnt, prob in mid_cnt_prob]
+
+    def format_msgid(self, mid):
+        """
+        Return the text of message id 'mid' of its type's report.
+        """
+        lintres = self.lintres
+        hlist, clist = lintres.get_flist_by_id(mid)
+        parts = []
+        format_flist_by_id(parts, mid, hlist, clist)
+        for (fname, cnt) in hlist + clist:
+            format_file_info(parts, fname, lintres.get_info_by_id_and_file(mid, fname),
+                             self.desc2text)
+        return ''.join(parts)
+
+    ## End of internal methods.
+
+    def generate(self, mtypes, workers=1):
+        """
+        Write the report of each type in 'mtypes' to
+        './report/report_<suffix>_<type>.txt', rendering
+        message ids in a pool of 'workers' processes.
+        """
+        summary = []
+        format_msg_cnt_prob_by_type(summary, self.lintres.get_total(),
+                                    self.lintres.get_msg_count_prob_by_type())
+        summary = ''.join(summary)
+
+        pool = None
+        if workers > 1:
+            pool = multiprocessing.Pool(workers, init_report_worker, (self,))
+        try:
+            for mtype in mtypes:
+                path = self.report_path(mtype)
+                with open(path, 'w', BUFSIZE) as out:
+                    mids = self.write_header(out, mtype, summary)
+                    if pool is None:
+                        texts = (self.format_msgid(mid) for mid in mids)
+                    else:
+                        texts = pool.imap(format_msgid, mids)
+                    for text in texts:
+                        out.write(text)
+                print >> sys.stderr, '\nReport %s generated for %s.\n' \
+                    % (os.path.basename(path), mtype)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+class ReportJob(object):
+    """
+    class ReportJob generates reports in a background process
+    while the console is in use. The process is forked, so
+    'target' may be any callable sharing the parent's results.
+    What the process prints goes to 'log_path'.
+    """
+    def __init__(self, target, log_path='./report/report.log'):
+        self.target = target
+        self.log_path = log_path
+        self.proc = None
+
+    def start(self):
+        self.proc = multiprocessing.Process(target=run_job,
+                                            args=(self.target, self.log_path))
+        self.proc.start()
+
+    def get_status(self):
+        """
+        Return 'running', 'done' or 'failed'.
+        """
+        if self.proc.is_alive():
+            return 'running'
+        if self.proc.exitcode == 0:
+            return 'done'
+        return 'failed'
+
+    def join(self):
+        self.proc.join()
+
+def run_job(target, log_path):
+    """
+    Run 'target' in the background process of a 'ReportJob'.
+    """
+    log = open(log_path, 'w', 1)
+    sys.stdout = sys.stderr = log
+    target()
+    log.flush()
+
+## The 'LintReport' being generated, set in each pool worker.
+worker_report = None
+
+def init_report_worker(report):
+    global worker_report
+    worker_report = report
+
+def format_msgid(mid):
+    """
+    Return the text of message id 'mid', rendered in a worker process.
+    """
+    return worker_report.format_msgid(mid)
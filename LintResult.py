@@ -6,39 +6,201 @@ It will be used by 'LintAnalysis' module.
 """
 
 import os
-import re
-import bisect
+import mmap
+import multiprocessing
+from bisect import bisect_left, bisect_right
+from array import array
 from operator import itemgetter
+from itertools import chain
 import common as cmn
+from LintTree import DirTree
+
+class RecordStore(object):
+    """
+    class RecordStore keeps every record of a lint output in
+    columns, so a record costs a few machine integers instead
+    of a tuple of Python objects. Records are identified by
+    their index in the columns, in the order they were added
+    unless 'reorder' moved them.
+
+    Data Structure:
+    1. 'msg_ids', 'file_ids', 'lines'
+       array('i') columns, one entry per record.
+    2. 'fnames', 'fname2id'
+       Interned file names, 'file_ids' index into 'fnames'.
+    3. 'desc_ids', 'descs', 'desc2id'
+       Interned descriptions, 'desc_ids' index into 'descs'.
+    4. 'desc_offs', 'desc_lens', 'src'
+       Used instead of 3. when the store is backed by the memory
+       mapped output file 'src'. Descriptions are kept as
+       (offset, length) into the mapping and only read when asked for.
+    """
+    __slots__ = ('msg_ids', 'file_ids', 'lines', 'desc_ids',
+                 'desc_offs', 'desc_lens', 'fnames', 'fname2id',
+                 'descs', 'desc2id', 'src', 'mapping')
+
+    ## (column, typecode), offsets are longs to address large files.
+    columns = (('msg_ids', 'i'), ('file_ids', 'i'), ('lines', 'i'),
+               ('desc_ids', 'i'), ('desc_offs', 'l'), ('desc_lens', 'i'))
+
+    def __init__(self, src=None):
+        for col, code in self.columns:
+            setattr(self, col, array(code))
+        self.fnames = []
+        self.fname2id = {}
+        self.descs = []
+        self.desc2id = {}
+        self.src = src
+        self.mapping = None
+
+    def __len__(self):
+        return len(self.msg_ids)
+
+    def get_mapping(self):
+        """
+        Return the read-only memory mapping of 'src',
+        mapping it on first use.
+        """
+        if self.mapping is None:
+            with open(self.src, 'rb') as f:
+                self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.mapping
+
+    def intern_fname(self, fname):
+        """
+        Return the id of file name 'fname'.
+        """
+        fid = self.fname2id.get(fname)
+        if fid is None:
+            fid = self.fname2id[fname] = len(self.fnames)
+            self.fnames.append(fname)
+        return fid
+
+    def intern_desc(self, desc):
+        """
+        Return the id of description 'desc'.
+        """
+        did = self.desc2id.get(desc)
+        if did is None:
+            did = self.desc2id[desc] = len(self.descs)
+            self.descs.append(desc)
+        return did
+
+    def add(self, msg_id, fname, line_num, desc):
+        """
+        Append a record, return (record, file_id).
+        """
+        rec = len(self.msg_ids)
+        fid = self.intern_fname(fname)
+        self.msg_ids.append(msg_id)
+        self.file_ids.append(fid)
+        self.lines.append(line_num)
+        self.desc_ids.append(self.intern_desc(desc))
+        return rec, fid
+
+    def add_mapped(self, msg_id, fname, line_num, desc_off, desc_len):
+        """
+        Append a record whose description is 'desc_len' bytes
+        at 'desc_off' in 'src', return (record, file_id).
+        """
+        rec = len(self.msg_ids)
+        fid = self.intern_fname(fname)
+        self.msg_ids.append(msg_id)
+        self.file_ids.append(fid)
+        self.lines.append(line_num)
+        self.desc_offs.append(desc_off)
+        self.desc_lens.append(desc_len)
+        return rec, fid
+
+    def reorder(self, order):
+        """
+        Move the records so that the 'order'[i]-th record becomes
+        the i-th one. Return an array mapping old records to new.
+        """
+        for col, code in self.columns:
+            values = getattr(self, col)
+            if values:
+                setattr(self, col, array(code, [values[rec] for rec in order]))
+        old2new = array('i', [0]) * len(order)
+        for new, old in enumerate(order):
+            old2new[old] = new
+        return old2new
+
+    def desc(self, rec):
+        if self.src is None:
+            return self.descs[self.desc_ids[rec]]
+        off = self.desc_offs[rec]
+        return self.get_mapping()[off : off + self.desc_lens[rec]]
+
+    def extend(self, other):
+        """
+        Append all records of store 'other', both stores must be
+        backed by the same kind of description storage.
+        Return (offset, file_map): the index of the first appended
+        record and a list mapping file ids of 'other' to ours.
+        """
+        offset = len(self.msg_ids)
+        fmap = [self.intern_fname(fname) for fname in other.fnames]
+        self.msg_ids.extend(other.msg_ids)
+        self.lines.extend(other.lines)
+        self.file_ids.extend(array('i', [fmap[fid] for fid in other.file_ids]))
+        if self.src is None:
+            dmap = [self.intern_desc(desc) for desc in other.descs]
+            self.desc_ids.extend(array('i', [dmap[did] for did in other.desc_ids]))
+        else:
+            self.desc_offs.extend(other.desc_offs)
+            self.desc_lens.extend(other.desc_lens)
+        return offset, fmap
+
+    def __getstate__(self):
+        ## Arrays pickle as lists, store their raw bytes instead.
+        ## The mapping is not pickled, it is reopened from 'src'.
+        return (dict((col, getattr(self, col).tostring())
+                     for col, code in self.columns),
+                self.fnames, self.descs, self.src)
+
+    def __setstate__(self, state):
+        cols, self.fnames, self.descs, self.src = state
+        for col, code in self.columns:
+            setattr(self, col, array(code))
+            getattr(self, col).fromstring(cols[col])
+        self.fname2id = dict((fname, fid) for fid, fname in enumerate(self.fnames))
+        self.desc2id = dict((desc, did) for did, desc in enumerate(self.descs))
+        self.mapping = None
 
 class LintMsg(object):
     """
     class LintMsg represents a detailed lint message
     identified by a unique messge ID. It contains the
     collection of records that correspond to the message.
+    It is a view over the 'RecordStore' holding the records.
 
     Data Structure:
     1. 'type2file'
-       A dict mapping type of file to a file list.
-       The file List is sorted by file name for easy lookup.
-       'c' -> [1.c, 2.c, 3.c, ...]
-       'h' -> [1.h, 2.h, 3.h, ...]
-    2. file2info
-       A dict mapping file name to a list of (line#, desc) tuples.
-       This List is sorted by line#.
-       '1.c' -> [(1, xxx), (2, yyy), ...]
-       '1.h' -> [(1, xxx), (2, yyy), ...]
-       ......
-    3. file2msg_count
-       A dict mapping file name to the number of message it has.
-    4. 'id'
+       A dict mapping type of file to the set of its files.
+       'c' -> set([1.c, 2.c, 3.c, ...])
+       'h' -> set([1.h, 2.h, 3.h, ...])
+       The lists sorted by file name are built on demand and
+       cached in 'type2flist' until a file is added.
+    2. file2recs
+       A dict mapping file id to an array of its records,
+       in the order they appear in the output.
+       The records sorted by line# are cached in 'file2sorted'
+       until a record of the file is added.
+    3. 'id'
        message id
-    5. 'total'
+    4. 'total'
        total count of the message.
+    5. 'store'
+       The 'RecordStore' holding the records.
 
     Methods used internally:
     1. update_total(self)
-    2. add_record(self, ftype, fname, line_num, desc)
+    2. add_record(self, ftype, fname, fid, rec)
+    3. merge(self, other, offset, fmap)
+    4. renumber(self, old2new)
+    5. get_sorted_files(self, ftype)
+    6. get_sorted_recs(self, fid)
 
     Methods used as interface.
     (but only for class 'LintResult'. We'll let 'LintResult'
@@ -47,60 +209,124 @@ class LintMsg(object):
     2. get_flist_by_type(self, ftype)
     3. get_info_by_type(self, fname)
     """
-    def __init__(self, msg_id):
+    __slots__ = ('id', 'total', 'type2file', 'type2flist',
+                 'file2recs', 'file2sorted', 'store')
+
+    def __init__(self, msg_id, store):
         self.id = msg_id
         self.total = 0
-        ## Map file type of a list of files.
+        self.store = store
+        ## Map file type of a set of files.
         self.type2file = {}
-        self.type2file['h'] = []
-        self.type2file['c'] = []
+        self.type2file['h'] = set()
+        self.type2file['c'] = set()
+        ## Map file type to the cached sorted list of its files.
+        self.type2flist = {}
 
-        ## Map file to a list of (line_num, desc)
-        self.file2info = {}
-        ## Map file to a the total message count it gets.
-        self.file2msg_count = {}
+        ## Map file id to an array of records.
+        self.file2recs = {}
+        ## Map file id to the cached array of records sorted by line#.
+        self.file2sorted = {}
 
     def update_total(self):
         self.total += 1
 
-    def add_record(self, ftype, fname, line_num, desc):
+    def add_record(self, ftype, fname, fid, rec):
         """
         Add a record. Record should be sorted by the file name.
 
-        'record' is a (file_type, file_name, line#, description) tuple
-        represents detailed information belongs to a given message.
+        'rec' is the index of a record in the store, 'fname' the
+        interned name of file 'fid' of type 'ftype' it belongs to.
         """
-        if ftype == 'h': # header file
-            ## each key value relates to a list of
-            ## (file_name, line#, description) tuples.
-            if fname not in self.type2file['h']:
-                bisect.insort(self.type2file['h'], fname)
-        else: # c file
-            if fname not in self.type2file['c']:
-                bisect.insort(self.type2file['c'], fname)
-
-        if not self.file2info.has_key(fname):
-            self.file2info[fname] = [(line_num, desc)]
+        if not self.file2recs.has_key(fid):
+            self.file2recs[fid] = array('i', [rec])
+            ## ftype is 'h' for header files, 'c' for c files.
+            self.type2file[ftype].add(fname)
+            self.type2flist.pop(ftype, None)
         else:
-            self.file2info[fname].append((line_num, desc))
-            
-        self.file2msg_count[fname] = \
-            self.file2msg_count.get(fname, 0) + 1
+            self.file2recs[fid].append(rec)
+            self.file2sorted.pop(fid, None)
 
         self.update_total()
 
+    def merge(self, other, offset, fmap):
+        """
+        Append the records of 'other', a 'LintMsg' with the same id
+        parsed from a later part of the output, to this message.
+        'offset' and 'fmap' are returned by 'RecordStore.extend'.
+        """
+        for ftype, flist in other.type2file.iteritems():
+            for fname in flist:
+                ofid = other.store.fname2id[fname]
+                recs = array('i', [rec + offset for rec in other.file2recs[ofid]])
+                fid = fmap[ofid]
+                if self.file2recs.has_key(fid):
+                    self.file2recs[fid].extend(recs)
+                    self.file2sorted.pop(fid, None)
+                else:
+                    self.file2recs[fid] = recs
+                    self.type2file[ftype].add(self.store.fnames[fid])
+                    self.type2flist.pop(ftype, None)
+
+        self.total += other.total
+
+    def renumber(self, old2new):
+        """
+        Map records through 'old2new' after 'RecordStore.reorder'.
+        """
+        for fid, recs in self.file2recs.iteritems():
+            self.file2recs[fid] = array('i', [old2new[rec] for rec in recs])
+        self.file2sorted = {}
+
+    def __getstate__(self):
+        return (self.id, self.total, self.type2file, self.store,
+                dict((fid, recs.tostring())
+                     for fid, recs in self.file2recs.iteritems()))
+
+    def __setstate__(self, state):
+        self.id, self.total, self.type2file, self.store, file2recs = state
+        self.type2flist = {}
+        self.file2sorted = {}
+        self.file2recs = {}
+        for fid, recs in file2recs.iteritems():
+            self.file2recs[fid] = array('i')
+            self.file2recs[fid].fromstring(recs)
+
     def get_total(self):
         """
         Return total count of the message.
         """
         return self.total
 
+    def get_sorted_files(self, ftype):
+        """
+        Return files of type 'ftype' sorted by file name.
+        """
+        flist = self.type2flist.get(ftype)
+        if flist is None:
+            flist = self.type2flist[ftype] = sorted(self.type2file[ftype])
+        return flist
+
+    def get_sorted_recs(self, fid):
+        """
+        Return records of file 'fid' sorted by line#, records on
+        the same line keep the order they appear in the output.
+        """
+        recs = self.file2sorted.get(fid)
+        if recs is None:
+            recs = array('i', sorted(self.file2recs[fid],
+                                     key=self.store.lines.__getitem__))
+            self.file2sorted[fid] = recs
+        return recs
+
     def get_linenums_by_file(self, fname):
-        return [num for (num, info) in sorted(self.file2info[fname], key=itemgetter(0))]
+        lines = self.store.lines
+        recs = self.get_sorted_recs(self.store.fname2id[fname])
+        return [lines[rec] for rec in recs]
 
     def get_file_linenum(self):
-        hlist = self.type2file.get('h')
-        clist = self.type2file.get('c')
+        hlist = self.get_sorted_files('h')
+        clist = self.get_sorted_files('c')
 
         fn2lnums = {}
         for fname in hlist:
@@ -117,41 +343,113 @@ class LintMsg(object):
         has the type 'ftype'. List is sorted by file name.
         """
         try:
-            flist = self.type2file.get(ftype)
+            flist = self.get_sorted_files(ftype)
         except KeyError:
             print 'Invalid Key for type2file!!!'
 
-        return [(fname, self.file2msg_count[fname]) for fname in flist]
+        fname2id = self.store.fname2id
+        return [(fname, len(self.file2recs[fname2id[fname]])) for fname in flist]
 
     def get_info_by_file(self, fname):
         """
         Return list:
         [line_num, description]:sorted by line_num
         """
-        return sorted(self.file2info[fname],
-                      key=lambda a : a[0])
+        store = self.store
+        recs = self.get_sorted_recs(store.fname2id[fname])
+        lines = store.lines
+        if store.src is None:
+            descs = store.descs
+            desc_ids = store.desc_ids
+            return [(lines[rec], descs[desc_ids[rec]]) for rec in recs]
+        return [(lines[rec], store.desc(rec)) for rec in recs]
 
 class File(object):
-    def __init__(self, fname):
+    """
+    class File is a view over the records of a single source
+    file in a 'RecordStore'. Counts by line and by message type
+    are computed from its records when asked for.
+
+    The records sorted by line# and their line numbers are
+    cached in 'sorted_recs' and 'sorted_lines' for line range
+    lookups, until a record is added.
+    """
+    __slots__ = ('fname', 'recs', 'store', 'sorted_recs', 'sorted_lines')
+
+    def __init__(self, fname, store):
         self.fname = fname
-        self.line2msg = {}
-        self.total_msg = 0
-        self.mtype2cnt = {}
+        self.store = store
+        ## Records of the file in the order they appear in the output.
+        self.recs = array('i')
+        self.sorted_recs = None
+        self.sorted_lines = None
+
+    def add_record(self, rec):
+        self.recs.append(rec)
+        self.sorted_recs = None
 
-    def add_record(self, msgid, linenum, mtype):
-        self.mtype2cnt[mtype] = self.mtype2cnt.get(mtype, 0) + 1
-        self.total_msg += 1
-        self.line2msg[linenum] = self.line2msg.get(linenum, 0) + 1
+    def merge(self, other, offset):
+        """
+        Append the records of 'other', a 'File' with the same name
+        parsed from a later part of the output, to this file.
+        """
+        self.recs.extend(array('i', [rec + offset for rec in other.recs]))
+        self.sorted_recs = None
+
+    def __getstate__(self):
+        return (self.fname, self.store, self.recs.tostring())
+
+    def __setstate__(self, state):
+        self.fname, self.store, recs = state
+        self.recs = array('i')
+        self.recs.fromstring(recs)
+        self.sorted_recs = None
+        self.sorted_lines = None
+
+    @property
+    def mtype2cnt(self):
+        msgid2type = cmn.msgid2type
+        msg_ids = self.store.msg_ids
+        mtype2cnt = {}
+        for rec in self.recs:
+            mtype = msgid2type[msg_ids[rec]]
+            mtype2cnt[mtype] = mtype2cnt.get(mtype, 0) + 1
+        return mtype2cnt
+
+    @property
+    def line2msg(self):
+        lines = self.store.lines
+        line2msg = {}
+        for rec in self.recs:
+            line2msg[lines[rec]] = line2msg.get(lines[rec], 0) + 1
+        return line2msg
 
     def get_cnt_by_mtype(self):
         return self.mtype2cnt
 
     def get_total(self):
-        return self.total_msg
+        return len(self.recs)
 
     def get_linenums(self):
         return sorted(self.line2msg.iteritems(), key=itemgetter(0))
 
+    def get_recs_by_line_range(self, first, last):
+        """
+        Return records on lines 'first' to 'last' inclusive,
+        sorted by line#, then in the order they appear in the output.
+        """
+        recs = self.sorted_recs
+        if recs is None:
+            lines = self.store.lines
+            recs = array('i', sorted(self.recs, key=lines.__getitem__))
+            ## Set before 'sorted_recs' for concurrent readers.
+            self.sorted_lines = array('i', [lines[rec] for rec in recs])
+            self.sorted_recs = recs
+        sorted_lines = self.sorted_lines
+        lo = bisect_left(sorted_lines, first)
+        hi = bisect_right(sorted_lines, last)
+        return recs[lo : hi]
+
 class LintResult(object):
     """
     class LintResult represents the result generated
@@ -162,14 +460,32 @@ class LintResult(object):
     Data structure:
     1. msg_count_by_type:
     2. total_msg_num:
-    3. messages:
+    3. store:
+       The 'RecordStore' holding every record.
+    4. messages:
        A collection of class LintMsg.
+    5. files:
+       A collection of class File.
+    6. recs:
+       The records of the store in this result, in the order
+       they appear in the output. None for all of them.
+    7. dir_tree:
+       The 'DirTree' of the directories of 'files'.
 
     Methods used internally:
     1. init_msg_type_count(self)
-    2. count_msg_by_type(self)
+    2. count_msg_by_type(self, msg_ids)
     3. parse_line(self, line)
-    4. classify_msg_by_id(self)
+    4. add_record(self, msg_id, ftype, fname, line_num, desc)
+    5. index_record(self, msg_id, ftype, fid, rec)
+    6. classify_msg_by_id(self, start, end)
+    7. classify_msg_by_id_mmap(self, start, end)
+    8. split_chunks(self, nchunks)
+    9. merge(self, other)
+    10. build_dir_tree(self)
+    11. iter_file_recs(self, mtype)
+    12. iter_file_counts(self, mtype)
+    13. iter_line_counts(self, mtype)
 
     Methods used as interface to other modules:
     1. get_total(self)
@@ -185,13 +501,26 @@ class LintResult(object):
             print 'failed to open file %s at %s' % (fname, path)
 
         self.fname = fname
-        self.content = self.fobj.read()
+        self.path = path
         self.msg_count_by_type = {}
         self.total_msg_num = 0
+        self.store = RecordStore()
         ## Map message ID to 'LintMsg' object.
         self.messages = {}
         self.id_count_prob = []
+        ## Map message type to its [(message_id, count, prob)],
+        ## sorted by message id.
+        self.type2id_count_prob = {}
         self.files = {}
+        self.recs = None
+        self.dir_tree = None
+
+        ## Set by a lazy 'process', until every message has been
+        ## built. Map message ID to an array of byte offsets of its
+        ## lines, and materialized message ID to its first record.
+        self.lazy = False
+        self.id2offsets = {}
+        self.id2first = {}
 
     ## Internal methods
 
@@ -202,24 +531,20 @@ class LintResult(object):
         for key in cmn.getMsgTypes():
             self.msg_count_by_type[key] = 0
 
-    def count_msg_by_type(self):
+    def count_msg_by_type(self, msg_ids):
         """
         Count how many times each message types occurs
         for statistic analysis purpose.
 
+        'msg_ids' is the list of message ids found on one line.
         Message type has been defined in 'common' module.
         """
-        self.init_msg_type_count()
-        patobj = re.compile(cmn.lint_msg_pat)
-        ## Find all matches matching pattern '[PC-Lint xxx]'.
-        matches = patobj.findall(self.content)
-        ## Get all message number from matching strings.
-        msg_ids = map(cmn.toInt, matches)
-        self.total_msg_num = len(msg_ids)
-
-        ## Compute count for each message type.
+        ## Ids matched by 'lint_msg_re' have at most 3 digits,
+        ## so they index the type table directly.
+        msgid2type = cmn.msgid2type
         for msgid in msg_ids:
-            self.msg_count_by_type[cmn.getMsgTypeByID(msgid)] += 1
+            self.msg_count_by_type[msgid2type[int(msgid)]] += 1
+        self.total_msg_num += len(msg_ids)
 
     def parse_line(self, line):
         """
@@ -240,52 +565,349 @@ class LintResult(object):
 
         return (ftype, str(fname), int(line_num), desc)
 
-    def classify_msg_by_id(self):
+    def add_record(self, msg_id, ftype, fname, line_num, desc):
+        """
+        Add a parsed record to its 'LintMsg' and 'File' objects.
+        """
+        rec, fid = self.store.add(msg_id, fname, line_num, desc)
+        self.index_record(msg_id, ftype, fid, rec)
+
+    def index_record(self, msg_id, ftype, fid, rec):
+        """
+        Add record 'rec' of the store to its 'LintMsg' and 'File' objects.
+        """
+        self.index_msg_record(msg_id, ftype, fid, rec)
+        self.index_file_record(fid, rec)
+
+    def index_msg_record(self, msg_id, ftype, fid, rec):
+        if not self.messages.has_key(msg_id):
+            ## If this the first time identifing the
+            ## message id, create a 'LintMsg' object for it.
+            self.messages[msg_id] = LintMsg(msg_id, self.store)
+        ## Use the interned name so each file name is stored once.
+        self.messages[msg_id].add_record(ftype, self.store.fnames[fid], fid, rec)
+
+    def index_file_record(self, fid, rec):
+        fname = self.store.fnames[fid]
+        if not self.files.has_key(fname):
+            self.files[fname] = File(fname, self.store)
+        self.files[fname].add_record(rec)
+
+    def classify_msg_by_id(self, start=0, end=None):
         """
         Classfiy messages by their unique ID. This method
         will generate a collection of 'LintMsg' objects which
         can guide us to modify the code and perform statistical analysis.
+
+        The output is streamed line by line, so message types are
+        counted and records are classified in a single pass without
+        holding the whole file in memory. Only lines starting in the
+        byte range ['start', 'end') are parsed, 'start' must be the
+        beginning of a line.
+        """
+        self.init_msg_type_count()
+        patobj = cmn.lint_msg_re
+        self.fobj.seek(start)
+        pos = start
+        for line in self.fobj:
+            if end is not None and pos >= end:
+                break
+            pos += len(line)
+            ## Find all matches matching pattern '[PC-Lint xxx]'.
+            msg_ids = patobj.findall(line)
+            if msg_ids: ## found a match
+                self.count_msg_by_type(msg_ids)
+                ftype, fname, line_num, desc = \
+                    self.parse_line(line.rstrip('\n'))
+                self.add_record(int(msg_ids[0]), ftype, fname,
+                                line_num, desc)
+        self.fobj.close()
+
+    def classify_msg_by_id_mmap(self, start=0, end=None):
+        """
+        Same as 'classify_msg_by_id' but scan the memory mapped
+        output for '[PC-Lint xxx]' markers and only build strings
+        for the file name and line number of a record. Descriptions
+        stay in the mapping as (offset, length).
+        """
+        self.init_msg_type_count()
+        self.fobj.close()
+        if self.store.src is None:
+            self.store = RecordStore(os.path.abspath(os.path.join(self.path, self.fname)))
+        if os.path.getsize(self.store.src) == 0:
+            return ## An empty file can't be mapped.
+
+        store = self.store
+        mm = store.get_mapping()
+        if end is None:
+            end = len(mm)
+        msgid2type = cmn.msgid2type
+        count = self.msg_count_by_type
+        src_len = len(cmn.src_path)
+        line_start = -1
+        for m in cmn.lint_msg_re.finditer(mm, start, end):
+            msg_id = int(m.group(1))
+            count[msgid2type[msg_id]] += 1
+            self.total_msg_num += 1
+
+            ls = mm.rfind('\n', 0, m.start()) + 1
+            if ls == line_start:
+                ## Only the first message of a line is a record.
+                continue
+            line_start = ls
+            le = mm.find('\n', m.end())
+            if le == -1:
+                le = len(mm)
+
+            ## Split 'path:line#:desc' like 'parse_line' does.
+            c1 = mm.find(':', ls, le)
+            c2 = mm.find(':', c1 + 1, le)
+            path = mm[ls : c1]
+            if path.endswith('.c'):
+                ftype = 'c' # c source file
+            else: ## include .inl file.
+                ftype = 'h' # header file
+
+            rec, fid = store.add_mapped(msg_id, path[src_len:],
+                                        int(mm[c1 + 1 : c2]), c2 + 1, le - c2 - 1)
+            self.index_record(msg_id, ftype, fid, rec)
+
+    def count_msg_offsets(self):
+        """
+        First pass of a lazy 'process': only count messages and
+        remember the byte offset of the line of every message.
+        """
+        self.init_msg_type_count()
+        patobj = cmn.lint_msg_re
+        pos = 0
+        for line in self.fobj:
+            msg_ids = patobj.findall(line)
+            if msg_ids: ## found a match
+                self.count_msg_by_type(msg_ids)
+                msg_id = int(msg_ids[0])
+                if not self.id2offsets.has_key(msg_id):
+                    self.id2offsets[msg_id] = array('l')
+                self.id2offsets[msg_id].append(pos)
+            pos += len(line)
+        self.fobj.close()
+
+    def materialize_msg(self, msgid):
         """
-        lines = self.content.split('\n')
-        for line in lines:
-            m = re.search(cmn.lint_msg_pat, line)
-            if m: ## found a match
-                msg_id = cmn.toInt(m.group(0))
-                if not self.messages.has_key(msg_id):
-                    ## If this the first time identifing the
-                    ## message id, create a 'LintMsg' object for it.
-                    self.messages[msg_id] = LintMsg(msg_id)
-
-                ftype, fname, line_num, desc = self.parse_line(line)
-                self.messages[msg_id].add_record(ftype, fname,
-                                                 line_num, desc)
-
-                if not self.files.has_key(fname):
-                    self.files[fname] = File(fname)
-                self.files[fname].add_record(msg_id, line_num,
-                                             cmn.getMsgTypeByID(msg_id))
-                   
+        Build the 'LintMsg' of 'msgid' by reading back its lines.
+        Its records are added to the store consecutively, in the
+        order they appear in the output.
+        """
+        self.id2first[msgid] = len(self.store)
+        with open(os.path.join(self.path, self.fname), 'r') as f:
+            for off in self.id2offsets[msgid]:
+                f.seek(off)
+                ftype, fname, line_num, desc = \
+                    self.parse_line(f.readline().rstrip('\n'))
+                rec, fid = self.store.add(msgid, fname, line_num, desc)
+                self.index_msg_record(msgid, ftype, fid, rec)
+
+    def materialize_all(self):
+        """
+        Build every message not built yet and the 'File' objects in
+        one more pass over the output. Messages built before were
+        added to the store out of order, the store is then reordered
+        so its records are in the order they appear in the output.
+        """
+        if not self.lazy:
+            return
+
+        store = self.store
+        patobj = cmn.lint_msg_re
+        ## Index of the next line of each message id.
+        next_line = {}
+        ## Records in the order of their lines in the output.
+        order = array('i')
+        with open(os.path.join(self.path, self.fname), 'r') as f:
+            for line in f:
+                m = patobj.search(line)
+                if not m:
+                    continue
+                msg_id = int(m.group(1))
+                if self.id2first.has_key(msg_id):
+                    k = next_line.get(msg_id, 0)
+                    next_line[msg_id] = k + 1
+                    order.append(self.id2first[msg_id] + k)
+                else:
+                    ftype, fname, line_num, desc = self.parse_line(line.rstrip('\n'))
+                    rec, fid = store.add(msg_id, fname, line_num, desc)
+                    self.index_msg_record(msg_id, ftype, fid, rec)
+                    order.append(rec)
+
+        if self.id2first:
+            old2new = store.reorder(order)
+            for msg in self.messages.itervalues():
+                msg.renumber(old2new)
+        file_ids = store.file_ids
+        for rec in xrange(len(store)):
+            self.index_file_record(file_ids[rec], rec)
+
+        self.lazy = False
+        self.id2offsets = {}
+        self.id2first = {}
+
+    def get_msg(self, msgid):
+        """
+        Return the 'LintMsg' of 'msgid', building it if needed.
+        """
+        if not self.messages.has_key(msgid) and self.id2offsets.has_key(msgid):
+            self.materialize_msg(msgid)
+        return self.messages[msgid]
+
+    def split_chunks(self, nchunks):
+        """
+        Split the output file into at most 'nchunks' byte ranges
+        [(start, end)] whose boundaries fall on line beginnings.
+        """
+        self.fobj.seek(0, os.SEEK_END)
+        size = self.fobj.tell()
+
+        bounds = [0]
+        for i in range(1, nchunks):
+            self.fobj.seek(max(size * i / nchunks, bounds[-1]))
+            if self.fobj.tell() > 0:
+                ## Skip to the start of the next line.
+                self.fobj.seek(-1, os.SEEK_CUR)
+                self.fobj.readline()
+            bounds.append(self.fobj.tell())
+        bounds.append(size)
+
+        return [(s, e) for s, e in zip(bounds[:-1], bounds[1:]) if s < e]
+
+    def merge(self, other):
+        """
+        Merge 'other', a partial result parsed from the part of the
+        output that follows the part parsed into this one.
+        """
+        for mtype, cnt in other.msg_count_by_type.iteritems():
+            self.msg_count_by_type[mtype] = \
+                self.msg_count_by_type.get(mtype, 0) + cnt
+        self.total_msg_num += other.total_msg_num
+
+        offset, fmap = self.store.extend(other.store)
+
+        for mid, msg in other.messages.iteritems():
+            if not self.messages.has_key(mid):
+                self.messages[mid] = LintMsg(mid, self.store)
+            self.messages[mid].merge(msg, offset, fmap)
+
+        for fname, f in other.files.iteritems():
+            fname = self.store.fnames[fmap[other.store.fname2id[fname]]]
+            if not self.files.has_key(fname):
+                self.files[fname] = File(fname, self.store)
+            self.files[fname].merge(f, offset)
+
+    def __getstate__(self):
+        ## Open file objects can't be pickled, partial results are
+        ## sent back from worker processes without it.
+        state = self.__dict__.copy()
+        state.pop('fobj', None)
+        ## Rebuilt from the messages, cheaper than pickling it.
+        state.pop('dir_tree', None)
+        return state
 
     def count_prob_forall_messages(self):
         """
         Return each message id, its count and prob.
         Sort by count number by decending order.
         """
-        idcnt = [(mid, msg.get_total()) for mid, msg in self.messages.iteritems()]
+        if self.lazy:
+            idcnt = [(mid, len(offs)) for mid, offs in self.id2offsets.iteritems()]
+        else:
+            idcnt = [(mid, msg.get_total()) for mid, msg in self.messages.iteritems()]
         sorted_idcnt = sorted(idcnt, key=lambda (k, v) : v, reverse=True)
 
         self.id_count_prob = \
             [(mid, cnt, float(cnt)/self.total_msg_num) for mid, cnt in sorted_idcnt]
 
+        self.index_msgids_by_type()
         return self.id_count_prob
 
+    def index_msgids_by_type(self):
+        """
+        Group 'id_count_prob' by message type so that querying
+        the ids of a type is a dict lookup.
+        """
+        self.type2id_count_prob = dict((mtype, []) for mtype in cmn.getMsgTypes())
+        for mid, cnt, prob in sorted(self.id_count_prob, key=itemgetter(0)):
+            self.type2id_count_prob[cmn.getMsgTypeByID(mid)].append((mid, cnt, prob))
+
+    def build_dir_tree(self):
+        """
+        Build 'dir_tree' from the count of each message in each
+        file, without going through the records.
+        """
+        tree = DirTree()
+        fnames = self.store.fnames
+        for mid, msg in self.messages.iteritems():
+            for fid, recs in msg.file2recs.iteritems():
+                tree.add(fnames[fid], mid, len(recs))
+        self.dir_tree = tree
+
+    def iter_file_recs(self, mtype):
+        """
+        Yield (file, records) of every file with messages of type
+        'mtype', or of any type if 'mtype' is None. Records of a
+        type are taken from its messages, not from all records.
+        """
+        self.materialize_all()
+        if mtype is None:
+            for fname, f in self.files.iteritems():
+                yield fname, f.recs
+            return
+
+        fid2recs = {}
+        for mid, cnt, prob in self.get_msgid_count_prob_by_type(mtype):
+            for fid, recs in self.messages[mid].file2recs.iteritems():
+                fid2recs.setdefault(fid, []).append(recs)
+        fnames = self.store.fnames
+        for fid, parts in fid2recs.iteritems():
+            yield fnames[fid], chain(*parts)
+
+    def iter_file_counts(self, mtype):
+        """
+        Yield (file, count, last line#) of every file with messages
+        of type 'mtype', or of any type if 'mtype' is None.
+        """
+        lines = self.store.lines
+        for fname, recs in self.iter_file_recs(mtype):
+            linenums = [lines[rec] for rec in recs]
+            yield fname, len(linenums), max(linenums)
+
+    def iter_line_counts(self, mtype):
+        """
+        Yield (file, line#, distinct message ids, count) of every
+        line with messages of type 'mtype', or of any type if
+        'mtype' is None. Lines are counted one file at a time.
+        """
+        msg_ids = self.store.msg_ids
+        lines = self.store.lines
+        for fname, recs in self.iter_file_recs(mtype):
+            line2ids = {}
+            line2cnt = {}
+            for rec in recs:
+                msgid = msg_ids[rec]
+                line = lines[rec]
+                if line in line2cnt:
+                    line2ids[line].add(msgid)
+                    line2cnt[line] += 1
+                else:
+                    line2ids[line] = set([msgid])
+                    line2cnt[line] = 1
+            for line, cnt in line2cnt.iteritems():
+                yield fname, line, len(line2ids[line]), cnt
+
     ## End of internal methods.
 
 
     ## Misc Interface
 
     def has_msg(self, msgid):
-        return self.messages.has_key(msgid)
+        return self.messages.has_key(msgid) or self.id2offsets.has_key(msgid)
 
     def get_fname_suffix(self):
         """
@@ -299,6 +921,62 @@ class LintResult(object):
         """
         return self.total_msg_num
 
+    def get_recs(self):
+        """
+        Return the records of the store in this result,
+        in the order they appear in the output.
+        """
+        self.materialize_all()
+        if self.recs is None:
+            return xrange(len(self.store))
+        return self.recs
+
+    def select(self, recs):
+        """
+        Return a new 'LintResult' of the records 'recs' of this
+        one, sorted in output order. It shares the store of this
+        result and counts message types by the '[PC-Lint xxx]'
+        markers in the description of each record, like 'process'
+        counts them on each line.
+        """
+        self.materialize_all()
+        sub = LintResult(self.fname, self.path)
+        sub.fobj.close()
+        sub.store = store = self.store
+        sub.recs = recs
+        sub.init_msg_type_count()
+
+        patobj = cmn.lint_msg_re
+        fid2type = ['c' if fname.endswith('.c') else 'h' for fname in store.fnames]
+        msg_ids = store.msg_ids
+        file_ids = store.file_ids
+        ## Map description to its message ids, descriptions repeat a lot.
+        desc2ids = {}
+        for rec in recs:
+            msg_id = msg_ids[rec]
+            fid = file_ids[rec]
+            sub.index_record(msg_id, fid2type[fid], fid, rec)
+            desc = store.desc(rec)
+            ids = desc2ids.get(desc)
+            if ids is None:
+                ids = desc2ids[desc] = patobj.findall(desc) or [msg_id]
+            sub.count_msg_by_type(ids)
+        sub.count_prob_forall_messages()
+        sub.build_dir_tree()
+        return sub
+
+    def iter_records(self):
+        """
+        Yield (message_id, file, line#, description) of every
+        record, in the order they appear in the output.
+        """
+        self.materialize_all()
+        store = self.store
+        fnames = store.fnames
+        for rec in self.get_recs():
+            yield (store.msg_ids[rec], fnames[store.file_ids[rec]],
+                   store.lines[rec], store.desc(rec))
+
     ## End of misc interface.
 
     ## Interface for querying messages by type.
@@ -309,6 +987,8 @@ class LintResult(object):
         """
         mtypecnt = sorted(self.msg_count_by_type.iteritems(),
                         key=lambda (k, v) : k, reverse=True)
+        if self.total_msg_num == 0:
+            return [(t, c, 0.0) for t,c in mtypecnt]
         return [(t, c, float(c)/self.total_msg_num) for t,c in mtypecnt]
 
     def get_msgid_count_prob_by_type(self, mtype):
@@ -316,16 +996,7 @@ class LintResult(object):
         Return [message_id, count, prob] sorted by message_id
         for a given message type 'mtype'.
         """
-        mids = []
-        id_cnt_prob = []
-        mrange = cmn.getRangeOfMsgType(mtype)
-
-        for mid in self.messages.keys():
-            if mid in range(mrange[0], mrange[1]):
-                mids.append(mid)
-
-        return sorted([(mid, c, p) for mid, c, p in self.id_count_prob if mid in mids],
-                      key=itemgetter(0))
+        return self.type2id_count_prob.get(mtype, [])
                
     ## End of Interface for querying messages by type.
 
@@ -335,8 +1006,9 @@ class LintResult(object):
         Return all header files and c source files
         containing a given message id 'msgid'.
         """
-        hlist = self.messages[msgid].get_flist_by_type('h')
-        clist = self.messages[msgid].get_flist_by_type('c')
+        msg = self.get_msg(msgid)
+        hlist = msg.get_flist_by_type('h')
+        clist = msg.get_flist_by_type('c')
         return (hlist, clist)
 
     def get_info_by_id_and_file(self, msgid, fname):
@@ -344,10 +1016,10 @@ class LintResult(object):
         Return detailed information of a file 'fname' containing
         message whose id is 'msgid'.
         """
-        return self.messages[msgid].get_info_by_file(fname)
+        return self.get_msg(msgid).get_info_by_file(fname)
 
     def get_file_linenum_by_id(self, msgid):
-        return self.messages[msgid].get_file_linenum()
+        return self.get_msg(msgid).get_file_linenum()
 
     ## End of Interface for querying messages by message id.
 
@@ -356,6 +1028,7 @@ class LintResult(object):
     def get_files_by_type(self, ftype):
         find_c_file = lambda f : f.endswith('.c')
         find_h_file = lambda f : f.endswith('.h') or f.endswith('inl')
+        self.materialize_all()
 
         if ftype == 'c':
             files = filter(find_c_file, self.files.keys())
@@ -366,6 +1039,7 @@ class LintResult(object):
         return files
 
     def get_cnt_linenums_by_fname(self, fname):
+        self.materialize_all()
         f = self.files[fname]
         
         mtype2cnt = f.get_cnt_by_mtype()
@@ -373,19 +1047,132 @@ class LintResult(object):
         linenums = f.get_linenums()
         return mtype2cnt, total, linenums
 
+    def get_records_by_line_range(self, fname, first, last):
+        """
+        Return [(line#, message_id, description)] of file 'fname'
+        on lines 'first' to 'last' inclusive, sorted by line#.
+        """
+        self.materialize_all()
+        store = self.store
+        return [(store.lines[rec], store.msg_ids[rec], store.desc(rec))
+                for rec in self.files[fname].get_recs_by_line_range(first, last)]
+
+
+    def get_dir_tree(self):
+        """
+        Return the 'DirTree' rolling up counts by directory.
+        """
+        if self.dir_tree is None:
+            self.materialize_all()
+            self.build_dir_tree()
+        return self.dir_tree
 
     ## End of interface for file.
 
-    def process(self):
+    ## Interface for ranking hotspots, of messages of type 'mtype'
+    ## or of any type if it's None. Ties are ranked by file name
+    ## then line#.
+
+    def get_top_files(self, k, mtype=None):
+        """
+        Return [(file, count)] of the 'k' files with the most messages.
+        """
+        return cmn.topK(k, ((fname, cnt) for fname, cnt, last
+                            in self.iter_file_counts(mtype)),
+                        key=cmn.fileCountKey)
+
+    def get_top_lines(self, k, mtype=None):
+        """
+        Return [(file, line#, distinct message ids, count)] of the
+        'k' lines with the most distinct message ids, then messages.
+        """
+        return cmn.topK(k, self.iter_line_counts(mtype),
+                        key=cmn.lineCountKey)
+
+    def get_top_density(self, k, mtype=None):
+        """
+        Return [(file, count, lines)] of the 'k' files with the
+        most messages per line, see 'common.topDensity'.
+        """
+        return cmn.topDensity(k, self.iter_file_counts(mtype))
+
+    ## End of interface for ranking hotspots.
+
+    def process(self, workers=1, cache=None, use_mmap=False, lazy=False):
         """
         A wrapper method for internal processing.
         Must be called first.
+
+        With 'workers' greater than one the output is split into
+        chunks parsed by a pool of processes, partial results are
+        merged in file order so they match the serial result.
+
+        With 'use_mmap' the output is memory mapped and descriptions
+        are read from the mapping only when they are queried.
+
+        With 'lazy' only counts and line offsets are gathered, each
+        'LintMsg' is built on first access to its message id, and all
+        of them the first time files are queried. 'workers' and
+        'use_mmap' don't apply to a lazy result.
+
+        The 'DirTree' is built once messages are classified, a lazy
+        result builds it the first time directories are queried.
+
+        'cache' is an optional 'LintCache', the result is loaded
+        from it if the output hasn't changed and stored into it
+        otherwise.
         """
-        self.count_msg_by_type()
-        self.classify_msg_by_id()
+        if cache is not None and cache.load(self):
+            self.fobj.close()
+            if not self.lazy:
+                self.build_dir_tree()
+            return
+
+        if lazy:
+            self.lazy = True
+            self.count_msg_offsets()
+        elif workers > 1:
+            chunks = self.split_chunks(workers)
+            self.fobj.close()
+            self.init_msg_type_count()
+            if use_mmap:
+                self.store = RecordStore(os.path.abspath(os.path.join(self.path, self.fname)))
+            pool = multiprocessing.Pool(workers)
+            try:
+                args = [(self.fname, self.path, cmn.src_path, use_mmap, start, end)
+                        for start, end in chunks]
+                for part in pool.imap(parse_chunk, args):
+                    self.merge(part)
+            finally:
+                pool.close()
+                pool.join()
+        elif use_mmap:
+            self.classify_msg_by_id_mmap()
+        else:
+            self.classify_msg_by_id()
         self.count_prob_forall_messages()
+        if not lazy:
+            self.build_dir_tree()
+
+        if cache is not None:
+            cache.store(self)
     
         
+def parse_chunk(args):
+    """
+    Parse one chunk of a lint output in a worker process.
+    'args' is a (fname, path, src_path, use_mmap, start, end)
+    tuple, return the partial 'LintResult' of the chunk.
+    """
+    fname, path, src_path, use_mmap, start, end = args
+    cmn.src_path = src_path
+    part = LintResult(fname, path)
+    if use_mmap:
+        part.classify_msg_by_id_mmap(start, end)
+    else:
+        part.classify_msg_by_id(start, end)
+    return part
+
 def main():
     lintres = LintResult()
     lintres.process()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+"""
+Module for serving queries on one resident lint result over
+local HTTP, so many users share a single parsed output.
+"""
+
+import gzip
+import threading
+import Queue
+import urllib
+import urlparse
+import BaseHTTPServer
+from cStringIO import StringIO
+from collections import OrderedDict
+from LintQuery import LintQuery
+
+## Default size of the response cache, in bytes of response bodies.
+CACHE_BYTES = 64 << 20
+
+## HTTP status of the errors of 'LintQuery'.
+error2status = {'Unknown query' : 404,
+                'Not found' : 404,
+                'Wrong arguments' : 400,
+                'Not supported' : 501}
+
+class LRUCache(object):
+    """
+    class LRUCache keeps values up to a total size of 'max_bytes',
+    dropping the least recently used ones. It is thread safe.
+    """
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.entries[key] = entry
+                return entry[0]
+        return None
+
+    def put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self.entries[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                k, (v, s) = self.entries.popitem(last=False)
+                self.nbytes -= s
+
+def gzip_body(body):
+    buf = StringIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6) as f:
+        f.write(body)
+    return buf.getvalue()
+
+def parse_query_path(path):
+    """
+    Map the path of a request to a (kind, args) query of 'LintQuery':
+    /types, /type/<type>, /id/<id>, /id/<id>/<file>, /files/<h|c>,
+    /file/<file>, /lines/<file>?first=<line#>&last=<line#>, /dir,
+    /dir/<dir>, /top/<files|lines|density>[/<type>|all[/<k>]],
+    /search?q=<terms> and /filter?q=<expression>.
+    File and directory names keep their slashes.
+    Return None for other paths.
+    """
+    url = urlparse.urlsplit(path)
+    parts = [urllib.unquote(p) for p in url.path.split('/') if p]
+    if not parts:
+        return None
+    kind, rest = parts[0], parts[1:]
+    if kind == 'id' and len(rest) > 2:
+        rest = [rest[0], '/'.join(rest[1:])]
+    elif kind in ('file', 'lines', 'dir') and rest:
+        rest = ['/'.join(rest)]
+    params = urlparse.parse_qs(url.query)
+    if kind == 'lines':
+        rest += params.get('first', ['']) + params.get('last', [''])
+    elif kind in ('search', 'filter'):
+        rest = ' '.join(params.get('q', [])).split()
+    return kind, rest
+
+class QueryHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    class QueryHandler answers GET requests with the JSON answer
+    of 'LintQuery', gzip compressed when the client accepts it.
+    Rendered responses are kept in the server's 'LRUCache'.
+    """
+    def do_GET(self):
+        server = self.server
+        response = server.cache.get(self.path)
+        if response is None:
+            response = self.render()
+            server.cache.put(self.path, response,
+                             len(response[1]) + len(response[2]))
+
+        status, body, gzbody = response
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzbody
+            encoding = 'gzip'
+        else:
+            encoding = None
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def render(self):
+        """
+        Return (status, body, gzipped body) of the request.
+        """
+        query = parse_query_path(self.path)
+        if query is None:
+            answer = {'query' : self.path, 'error' : 'Unknown query'}
+        else:
+            answer = self.server.query.answer_words(self.path, *query)
+        status = error2status.get(answer.get('error'), 200)
+        body = self.server.query.to_json(answer) + '\n'
+        return status, body, gzip_body(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class PooledHTTPServer(BaseHTTPServer.HTTPServer):
+    """
+    class PooledHTTPServer hands accepted requests to a fixed
+    pool of 'workers' threads through a queue.
+    """
+    def __init__(self, server_address, handler_class, workers):
+        BaseHTTPServer.HTTPServer.__init__(self, server_address, handler_class)
+        self.requests = Queue.Queue()
+        self.threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self.process_requests)
+            t.daemon = True
+            t.start()
+            self.threads.append(t)
+
+    def process_request(self, request, client_address):
+        self.requests.put((request, client_address))
+
+    def process_requests(self):
+        while True:
+            request, client_address = self.requests.get()
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+class LintServer(object):
+    """
+    class LintServer serves the queries of 'LintQuery' on one
+    resident result to any number of concurrent clients.
+
+    The result is materialized before serving and only read
+    afterwards, so request threads share it without copying or
+    locking. Caches filled on first read are plain dict stores.
+    """
+    def __init__(self, lintres, host='127.0.0.1', port=8080, workers=8,
+                 cache_bytes=CACHE_BYTES):
+        lintres.materialize_all()
+        self.httpd = PooledHTTPServer((host, port), QueryHandler, workers)
+        self.httpd.query = LintQuery(lintres)
+        ## Build the search index before any request does.
+        self.httpd.query.get_desc_index()
+        self.httpd.cache = LRUCache(cache_bytes)
+
+    def get_address(self):
+        return self.httpd.server_address
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        """
+        Stop 'serve_forever' from another thread.
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
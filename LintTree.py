@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+"""
+Module for rolling up lint message counts by directory
+through a trie of the paths of the files with messages.
+"""
+
+import common as cmn
+
+class DirNode(object):
+    """
+    class DirNode is a directory of a 'DirTree'.
+
+    Data Structure:
+    1. 'path'
+       Path of the directory, '' for the root.
+    2. 'children'
+       A dict mapping name to the 'DirNode' of each subdirectory.
+    3. 'files'
+       A dict mapping the path of each file right in the
+       directory to its count of messages.
+    4. 'total', 'type2cnt', 'id2cnt'
+       Count of messages in the directory and below it, in all,
+       by message type and by message id.
+    """
+    __slots__ = ('path', 'children', 'files', 'total', 'type2cnt', 'id2cnt')
+
+    def __init__(self, path):
+        self.path = path
+        self.children = {}
+        self.files = {}
+        self.total = 0
+        self.type2cnt = {}
+        self.id2cnt = {}
+
+class DirTree(object):
+    """
+    class DirTree is a trie of the directories of the files of
+    a processed result. Counts are added for each (file, message
+    id) pair rather than for each record and kept on every
+    directory of the file's path, so the counts of a directory
+    are found in as many steps as its path has components.
+
+    Methods used internally:
+    1. get_path_nodes(self, fname)
+    """
+    def __init__(self):
+        self.root = DirNode('')
+        ## Map file name to the nodes from the root to its directory.
+        self.fname2nodes = {}
+
+    ## Internal methods
+
+    def get_path_nodes(self, fname):
+        nodes = self.fname2nodes.get(fname)
+        if nodes is not None:
+            return nodes
+
+        node = self.root
+        nodes = [node]
+        parts = [part for part in fname.split('/')[:-1] if part]
+        for depth, part in enumerate(parts):
+            child = node.children.get(part)
+            if child is None:
+                child = node.children[part] = DirNode('/'.join(parts[:depth + 1]))
+            node = child
+            nodes.append(node)
+        self.fname2nodes[fname] = nodes
+        return nodes
+
+    ## End of internal methods.
+
+    def add(self, fname, msgid, cnt):
+        """
+        Add 'cnt' messages 'msgid' of file 'fname'.
+        """
+        mtype = cmn.msgid2type[msgid]
+        nodes = self.get_path_nodes(fname)
+        for node in nodes:
+            node.total += cnt
+            node.type2cnt[mtype] = node.type2cnt.get(mtype, 0) + cnt
+            node.id2cnt[msgid] = node.id2cnt.get(msgid, 0) + cnt
+        files = nodes[-1].files
+        files[fname] = files.get(fname, 0) + cnt
+
+    def get_node(self, path):
+        """
+        Return the 'DirNode' of directory 'path'.
+        Raise KeyError if no file with messages is under it.
+        """
+        node = self.root
+        for part in path.split('/'):
+            if part:
+                node = node.children[part]
+        return node
+
+    def get_counts(self, path):
+        """
+        Return (total, {message_type : count}, {message_id : count})
+        of the messages in directory 'path' and below it.
+        """
+        node = self.get_node(path)
+        return node.total, node.type2cnt, node.id2cnt
+
+    def get_subdirs(self, path):
+        """
+        Return [(subdirectory, count)] of directory 'path',
+        sorted by name.
+        """
+        node = self.get_node(path)
+        return [(child.path, child.total) for name, child in
+                sorted(node.children.iteritems())]
+
+    def get_files(self, path):
+        """
+        Return [(file, count)] of the files right in directory
+        'path', sorted by name.
+        """
+        return sorted(self.get_node(path).files.iteritems())
+
+    def iter_dirs(self, max_depth=None):
+        """
+        Yield (depth, node) of every directory below the root down
+        to 'max_depth' levels, parents first and sorted by name.
+        """
+        stack = [(1, child) for name, child in
+                 sorted(self.root.children.iteritems(), reverse=True)]
+        while stack:
+            depth, node = stack.pop()
+            yield depth, node
+            if max_depth is None or depth < max_depth:
+                stack.extend((depth + 1, child) for name, child in
+                             sorted(node.children.iteritems(), reverse=True))
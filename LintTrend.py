@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+"""
+Module for analysing the trend of lint messages across
+many historical lint output files.
+"""
+
+import os
+import multiprocessing
+from array import array
+import common as cmn
+
+def count_output(args):
+    """
+    Counting-only parser run in a worker process.
+    'args' is a (path, src_path) tuple, return (path, total,
+    type2cnt, id2cnt, file2cnt) of the lint output 'path'.
+    """
+    path, src_path = args
+    src_len = len(src_path)
+    msgid2type = cmn.msgid2type
+    patobj = cmn.lint_msg_re
+    total = 0
+    type2cnt = {}
+    id2cnt = {}
+    file2cnt = {}
+    with open(path, 'r') as f:
+        for line in f:
+            msg_ids = patobj.findall(line)
+            if not msg_ids:
+                continue
+            for msgid in msg_ids:
+                mtype = msgid2type[int(msgid)]
+                type2cnt[mtype] = type2cnt.get(mtype, 0) + 1
+            total += len(msg_ids)
+            ## Only the first message of a line is a record.
+            msgid = int(msg_ids[0])
+            id2cnt[msgid] = id2cnt.get(msgid, 0) + 1
+            fname = line.split(':', 1)[0][src_len:]
+            file2cnt[fname] = file2cnt.get(fname, 0) + 1
+    return path, total, type2cnt, id2cnt, file2cnt
+
+class LintTrend(object):
+    """
+    class LintTrend keeps, for every message type, message id and
+    file, a series of counts with one entry per lint output (run).
+    Only these count vectors are kept, so memory depends on the
+    number of distinct keys and runs, not on the size of the outputs.
+
+    Data Structure:
+    1. 'runs'
+       Names of the runs, oldest first.
+    2. 'totals'
+       array of the total message count of each run.
+    3. 'type2series', 'id2series', 'file2series'
+       Dicts mapping a key to an array of its count in each run.
+    """
+    def __init__(self, history_dir):
+        self.history_dir = history_dir
+        self.runs = []
+        self.totals = array('i')
+        self.type2series = {}
+        self.id2series = {}
+        self.file2series = {}
+
+    ## Internal methods
+
+    def list_outputs(self):
+        """
+        Return paths of the lint outputs in 'history_dir',
+        oldest first.
+        """
+        paths = [os.path.join(self.history_dir, fname)
+                 for fname in os.listdir(self.history_dir)]
+        paths = [p for p in paths if os.path.isfile(p)]
+        paths.sort(key=lambda p : (os.path.getmtime(p), p))
+        return paths
+
+    def add_counts(self, key2series, key2cnt):
+        """
+        Append one run of 'key2cnt' counts to the series.
+        """
+        nruns = len(self.runs)
+        for key, series in key2series.iteritems():
+            series.append(key2cnt.get(key, 0))
+        for key, cnt in key2cnt.iteritems():
+            if key not in key2series:
+                key2series[key] = array('i', [0] * nruns)
+                key2series[key].append(cnt)
+
+    def add_run(self, name, total, type2cnt, id2cnt, file2cnt):
+        self.add_counts(self.type2series, type2cnt)
+        self.add_counts(self.id2series, id2cnt)
+        self.add_counts(self.file2series, file2cnt)
+        self.totals.append(total)
+        self.runs.append(name)
+
+    def print_series(self, out, title, key_name, key2series, keys):
+        """
+        Print a table with a row per key and a column per run.
+        """
+        width = max([len(key_name)] + [len(str(k)) for k in keys]) + 2
+        print >> out, title
+        print >> out
+        print >> out, key_name.ljust(width),
+        print >> out, ''.join(('[%d]' % i).rjust(8) for i in range(len(self.runs))),
+        print >> out, 'Change'.rjust(10)
+        print >> out, '-' * (width + 8 * len(self.runs) + 12)
+        for key in keys:
+            series = key2series[key]
+            print >> out, str(key).ljust(width),
+            print >> out, ''.join(str(cnt).rjust(8) for cnt in series),
+            print >> out, str(series[-1] - series[0]).rjust(10)
+        print >> out
+
+    ## End of internal methods.
+
+    def process(self, workers=1):
+        """
+        Count every lint output of 'history_dir', in a pool
+        of 'workers' processes. Runs are added in order.
+        """
+        args = [(path, cmn.src_path) for path in self.list_outputs()]
+        if workers > 1:
+            pool = multiprocessing.Pool(workers)
+            try:
+                for counts in pool.imap(count_output, args):
+                    self.add_run(os.path.basename(counts[0]), *counts[1:])
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for arg in args:
+                counts = count_output(arg)
+                self.add_run(os.path.basename(counts[0]), *counts[1:])
+
+    def get_type_series(self):
+        """
+        Return [(run, total, [count of each type])], types ordered
+        like 'LintResult.get_msg_count_prob_by_type'.
+        """
+        mtypes = sorted(cmn.getMsgTypes(), reverse=True)
+        zeros = array('i', [0] * len(self.runs))
+        series = [self.type2series.get(t, zeros) for t in mtypes]
+        return [(run, self.totals[i], [s[i] for s in series])
+                for i, run in enumerate(self.runs)]
+
+    def report(self):
+        """
+        Write the trend tables to './report/trend_report.txt'.
+        """
+        fn = 'trend_report.txt'
+        with open(os.path.join('./report', fn), 'w') as out:
+            print >> out, '+' * 40
+            print >> out, 'Lint trend report.'
+            print >> out, '+' * 40
+            print >> out
+            print >> out, 'Runs:'
+            for i, run in enumerate(self.runs):
+                print >> out, '[%d]' % (i), run
+            print >> out
+
+            if self.runs:
+                mtypes = sorted(cmn.getMsgTypes(), reverse=True)
+                print >> out, 'Run'.ljust(8),
+                for mtype in mtypes:
+                    print >> out, str(mtype).ljust(16),
+                print >> out, 'Total'.ljust(10)
+                print >> out, '-' * (8 + 17 * len(mtypes) + 10)
+                for i, (run, total, counts) in enumerate(self.get_type_series()):
+                    print >> out, ('[%d]' % (i)).ljust(8),
+                    for cnt in counts:
+                        print >> out, str(cnt).ljust(16),
+                    print >> out, str(total).ljust(10)
+                print >> out
+
+                self.print_series(out, 'Counts by message ID.', 'Message ID',
+                                  self.id2series, sorted(self.id2series))
+                self.print_series(out, 'Counts by file.', 'File Name',
+                                  self.file2series, sorted(self.file2series))
+
+        print '\nTrend report %s has been generated.' % (fn)
+        print
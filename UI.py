@@ -3,13 +3,40 @@
 from LintResult import LintResult
 import common as cmn
 from LintCmp import LintCmp
+from LintCache import LintCache
+from LintDiff import LintDiff, SourceHashes
+from LintTrend import LintTrend
+from LintDB import LintDB, DBResult
+from LintBaseline import LintBaseline, write_baseline
+from LintExport import LintExport, FORMATS
+from LintQuery import LintQuery
+from LintServer import LintServer
+from LintFilter import LintFilter
+from LintReport import LintReport, ReportJob, format_msg_cnt_prob_by_type, \
+    format_msgid_cnt_prob_by_type, format_flist_by_id, format_file_info, \
+    format_dir_info, format_hotspots, TOP_FILES, TOP_LINES
 import os
+import sys
+
+## Message types reported when no filter is given.
+REPORT_TYPES = ['Syntax_Errors', 'Warnings']
+
+def get_report_types(lintres):
+    """
+    Return the message types 'lintres' has messages of.
+    """
+    return [mtype for mtype, cnt, prob in lintres.get_msg_count_prob_by_type()
+            if cnt > 0]
 
 class UI(object):
 
     def __init__(self):
         self.features = ['Query by message ID',
-                         'Query by file name']
+                         'Query by file name',
+                         'Query by directory',
+                         'Show hotspots']
+        ## 'ReportJob' generating reports in the background, if any.
+        self.report_job = None
 
         try:
             os.mkdir('./report')
@@ -17,20 +44,9 @@ class UI(object):
             pass
 
     def print_msg_cnt_prob_by_type(self, total, raw_msg_cnt_prob):
-        print '\nLint Messages counts and probabilities by message type:'
-
-        print '\nMessage Type'.ljust(25),
-        print 'Count'.ljust(9),
-        print 'Probability'.ljust(15)
-        print '-' * 46
-        for index, (msgtype, cnt, prob) in enumerate(raw_msg_cnt_prob):
-            print '[%d]' % (index), str(msgtype).ljust(20),
-            print str(cnt).ljust(9),
-            print '{0:.1f}%'.format(float(prob) * 100).ljust(15)
-
-        print '-' * 46
-        print 'Total:', total
-        print
+        parts = []
+        format_msg_cnt_prob_by_type(parts, total, raw_msg_cnt_prob)
+        sys.stdout.write(''.join(parts))
 
     def show_msgtype_and_get_type(self, lintres):
         """
@@ -56,37 +72,14 @@ class UI(object):
         return user_input
 
     def print_msgid_cnt_prob_by_type(self, mid_cnt_prob, mtype):
-        mrange = cmn.getRangeOfMsgType(mtype)
-        print '\nMessage Type:', mtype, '\tRange of ID:', mrange[0], 'to', mrange[1]-1
-        print 'IDs found:\n'
-        print 'Message ID'.ljust(12),
-        print 'Count'.ljust(7),
-        print 'Probability'.ljust(15)
-        print '-' * 32
-        for (msgid, cnt, prob) in mid_cnt_prob:
-            print str(msgid).ljust(12), str(cnt).ljust(7),
-            print '{0:.3f}%'.format(prob * 100).ljust(15)
-
-        print '-' * 32
-        print 'Number of distinct IDs:', (len(mid_cnt_prob))
-        print
-        
+        parts = []
+        format_msgid_cnt_prob_by_type(parts, mid_cnt_prob, mtype)
+        sys.stdout.write(''.join(parts))
+
     def print_flist_by_id(self, msgid, hlist, clist):
-        findex = 0
-        print
-        print ''.rjust(25), 'Message ID:', msgid
-        print 'File Name'.ljust(56), 'Count'
-        print '-' * 65
-        
-        for f, cnt in hlist:
-            print '[%d]' % (findex),
-            print '{0:48} ==> {1:3d}'.format(f, cnt)
-            findex += 1
-            
-        for f, cnt in clist:
-            print '[%d]' % (findex),
-            print '{0:48} ==> {1:3d}'.format(f, cnt)
-            findex += 1
+        parts = []
+        format_flist_by_id(parts, msgid, hlist, clist)
+        sys.stdout.write(''.join(parts))
 
     def show_msgids_by_type_and_get_a_msgid(self, res, mtype):
         mid_cnt_prob = res.get_msgid_count_prob_by_type(mtype)
@@ -128,56 +121,19 @@ class UI(object):
         return user_input
 
     def print_file_info(self, fname, finfo):
-        print '\nFile Name:', fname
-        print 'Line number'.ljust(16), 'Description'
-        print '-' * 75
-        for (linenum, desc) in finfo:
-            print '{0:11d} ==>'.format(linenum),
-            print desc[0 : 50]
-            times = 1 + len(desc) / 50
-            for x in range(1, times):
-                print ''.rjust(16), desc[x*50 : (x+1)*50]
-            print
-
-    def generate_report(self, lintres):
-        self.generate_report_by_type(lintres, 'Syntax_Errors')
-        self.generate_report_by_type(lintres, 'Warnings')
-
-    def generate_report_by_type(self, lintres, mtype):
-        import sys
-        old_stdout = sys.stdout
-        fname = 'report_'+lintres.get_fname_suffix()+'_'+mtype+'.txt'
-        sys.stdout = open(os.path.join('./report', fname), 'w')
-
-        msg_range = cmn.getRangeOfMsgType(mtype)
-        print '+' * 50
-        print 'Lint Report for DP600 Project.'
-        print 'Message Type: %s. Range of Message ID:(%d~%d)' % (mtype, msg_range[0], msg_range[1])
-        print '+' * 50
-        
-        self.print_msg_cnt_prob_by_type(lintres.get_total(),
-                                        lintres.get_msg_count_prob_by_type())
+        parts = []
+        format_file_info(parts, fname, finfo)
+        sys.stdout.write(''.join(parts))
 
-        mid_cnt_prob = lintres.get_msgid_count_prob_by_type(mtype)
-        self.print_msgid_cnt_prob_by_type(mid_cnt_prob, mtype)
-
-        mids = [mid for mid, cnt, prob in mid_cnt_prob]
-        for mid in mids:
-            hlist, clist = lintres.get_flist_by_id(mid)
-            self.print_flist_by_id(mid, hlist, clist)
-            
-            for (hfile, cnt) in hlist:
-                hinfo = lintres.get_info_by_id_and_file(mid, hfile)
-                self.print_file_info(hfile, hinfo)
-                
-            for (cfile, cnt) in clist:
-                cinfo = lintres.get_info_by_id_and_file(mid, cfile)
-                self.print_file_info(cfile, cinfo)            
+    def generate_report(self, lintres, workers=1, mtypes=REPORT_TYPES):
+        LintReport(lintres).generate(mtypes, workers)
 
-        print >> sys.stderr, '\nReport %s generated for %s.\n' % (fname, mtype)
-        sys.stdout = old_stdout
+    def generate_report_by_type(self, lintres, mtype, workers=1):
+        LintReport(lintres).generate([mtype], workers)
 
     def show_feature_list(self):
+        if self.report_job is not None:
+            print '\nReports:', self.report_job.get_status()
         print '\nFeature List:\n'
         for index, feature in enumerate(self.features):
             print '[%d] %s' % (index, feature)
@@ -330,24 +286,101 @@ class UI(object):
                 if user_input == 'c':
                     continue
 
-                
-    def start(self, lintres):
-        """
-        Start point of User Interface.
-        """
+
+    def print_dir_info(self, path, total, type2cnt, subdirs, files):
+        parts = []
+        format_dir_info(parts, path, total, type2cnt, subdirs, files)
+        sys.stdout.write(''.join(parts))
+
+    def show_dir_and_get_entry(self, tree, path):
+        total, type2cnt, id2cnt = tree.get_counts(path)
+        subdirs = tree.get_subdirs(path)
+        files = tree.get_files(path)
+        self.print_dir_info(path, total, type2cnt, subdirs, files)
+
+        print '\nEnter an index to open a directory or file, \'u\' to go up or type \'q\' to quit.\n'
+        user_input = raw_input('Enter index, up or quit: ')
+        if user_input != 'q' and user_input != 'u':
+            try:
+                return (subdirs + files)[int(user_input)][0]
+            except:
+                print 'Wrong index!\n'
+                return ''
+
+        return user_input
+
+    def start_query_by_dir(self, lintres):
+        tree = lintres.get_dir_tree()
+        path = ''
+        while True:
+            user_input = self.show_dir_and_get_entry(tree, path)
+            if user_input == 'q':
+                break
+            elif user_input == 'u':
+                path = path.rpartition('/')[0]
+            elif user_input == '':
+                continue
+            elif tree.get_node(path).files.has_key(user_input):
+                user_input = self.show_cnt_and_linenums_and_get_linenum(lintres, user_input)
+                if user_input == 'q':
+                    break
+            else:
+                path = user_input
+
+    def print_hotspots(self, lintres, mtype):
+        parts = []
+        format_hotspots(parts, mtype, lintres.get_top_files(TOP_FILES, mtype),
+                        lintres.get_top_lines(TOP_LINES, mtype),
+                        lintres.get_top_density(TOP_FILES, mtype))
+        sys.stdout.write(''.join(parts))
+
+    def start_hotspots(self, lintres):
         while True:
-            ## First let user choose a feature they want to use.
-            user_input = self.show_feature_list()
+            user_input = self.show_msgtype_and_get_type(lintres)
             if user_input == 'q':
                 print
                 break
+            elif user_input == '':
+                continue
 
-            if user_input == 0:
-                self.start_query_by_id(lintres)
-            elif user_input == 1:
-                self.start_query_by_file(lintres)
-            else:
-                print 'Please enter a valid index number! Try again.'                
+            self.print_hotspots(lintres, user_input)
+
+    def start(self, lintres):
+        """
+        Start point of User Interface.
+        """
+        try:
+            while True:
+                ## First let user choose a feature they want to use.
+                user_input = self.show_feature_list()
+                if user_input == 'q':
+                    print
+                    break
+
+                if user_input == 0:
+                    self.start_query_by_id(lintres)
+                elif user_input == 1:
+                    self.start_query_by_file(lintres)
+                elif user_input == 2:
+                    self.start_query_by_dir(lintres)
+                elif user_input == 3:
+                    self.start_hotspots(lintres)
+                else:
+                    print 'Please enter a valid index number! Try again.'                
+        finally:
+            self.join_reports()
+
+    def join_reports(self):
+        """
+        Wait for the background reports, if any, to finish.
+        """
+        if self.report_job is None:
+            return
+        if self.report_job.get_status() == 'running':
+            print 'Waiting for reports to be generated...'
+        self.report_job.join()
+        print 'Reports:', self.report_job.get_status(),
+        print '(log in %s)\n' % (self.report_job.log_path)
                 
 
 def main():
@@ -383,26 +416,267 @@ def main():
                       type="string",
                       default="lint.origout",
                       help="Specifiy a new lint output file, use lint.orgi_out as default if not specified.")
+
+    parser.add_option("-j", "--jobs",
+                      action="store",
+                      dest="workers",
+                      type="int",
+                      default=1,
+                      help="Specifiy how many processes are used to parse lint output files and generate reports. Default is 1.")
+
+    parser.add_option("-m", "--mmap",
+                      action="store_true",
+                      dest="use_mmap",
+                      default=False,
+                      help="Memory map lint output files and read message descriptions only when needed.")
+
+    parser.add_option("-l", "--lazy",
+                      action="store_true",
+                      dest="lazy",
+                      default=False,
+                      help="Only count messages at startup and build the details of a message ID when it is first queried.")
+
+    parser.add_option("-d", "--diff",
+                      action="store_true",
+                      dest="diff",
+                      default=False,
+                      help="With an old lint output, also report which messages are new and which are fixed.")
+
+    parser.add_option("--history",
+                      action="store",
+                      dest="history_dir",
+                      type="string",
+                      default=None,
+                      help="Specifiy a directory of historical lint output files, report the trend across them and quit.")
+
+    parser.add_option("--db",
+                      action="store",
+                      dest="db_path",
+                      type="string",
+                      default=None,
+                      help="Specifiy a SQLite database, parsed lint outputs are stored into it under their file names. An output stored before and unchanged since, same size and mtime, isn't stored again.")
+
+    parser.add_option("--run",
+                      action="store",
+                      dest="run",
+                      type="string",
+                      default=None,
+                      help="With --db, open the run of this name from the database instead of parsing the new lint output.")
+
+    parser.add_option("--write_baseline",
+                      action="store",
+                      dest="baseline_out",
+                      type="string",
+                      default=None,
+                      help="Write a baseline of the messages of the new lint output to this file and quit.")
+
+    parser.add_option("--gate",
+                      action="store",
+                      dest="baseline",
+                      type="string",
+                      default=None,
+                      help="Check the new lint output against this baseline file, exit with status 1 on the first new message.")
+
+    parser.add_option("--collect",
+                      action="store_true",
+                      dest="collect",
+                      default=False,
+                      help="With --gate, report all new messages before exiting.")
+
+    parser.add_option("--export",
+                      action="store",
+                      dest="export_dir",
+                      type="string",
+                      default=None,
+                      help="Export records, type, id and file counts of the new lint output to this directory and quit.")
+
+    parser.add_option("--export_format",
+                      action="store",
+                      dest="export_format",
+                      type="choice",
+                      choices=FORMATS,
+                      default="jsonl",
+                      help="Format of --export: jsonl, csv or bin. Default is jsonl.")
+
+    parser.add_option("--query",
+                      action="store",
+                      dest="query_file",
+                      type="string",
+                      default=None,
+                      help="Answer the queries in this file ('-' for stdin) on the new lint output, one JSON line per query on stdout, and quit. Queries: 'types', 'type TYPE', 'id ID [FILE]', 'files h|c', 'file FILE', 'lines FILE FIRST LAST', 'search TERM...', 'filter EXPRESSION', 'dir [DIR]', 'top files|lines|density [TYPE|all] [K]'.")
+
+    parser.add_option("--serve",
+                      action="store",
+                      dest="serve_port",
+                      type="int",
+                      default=None,
+                      help="Serve queries on the new lint output as JSON over HTTP on this port of localhost, until interrupted.")
+
+    parser.add_option("--serve_threads",
+                      action="store",
+                      dest="serve_threads",
+                      type="int",
+                      default=8,
+                      help="With --serve, how many threads answer requests. Default is 8.")
+
+    parser.add_option("--filter",
+                      action="store",
+                      dest="filter",
+                      type="string",
+                      default=None,
+                      help="Only keep the messages matching this expression for reports, comparisons, exports, queries and the console, like \"type=Warnings and id in (525,534) and file~'drivers/*' and line<500\". Fields: type, id, file, line, desc. Operators: =, !=, <, <=, >, >=, in (...), ~ (glob), combined with and, or, not.")
+
+    parser.add_option("--no_reports", "--no-reports",
+                      action="store_true",
+                      dest="no_reports",
+                      default=False,
+                      help="Don't generate report files, only start the console.")
+
+    parser.add_option("-c", "--cache_dir",
+                      action="store",
+                      dest="cache_dir",
+                      type="string",
+                      default="./cache",
+                      help="Specifiy where parsed lint outputs are cached. Default is ./cache.")
+
+    parser.add_option("--no_cache",
+                      action="store_false",
+                      dest="use_cache",
+                      default=True,
+                      help="Always parse lint output files, don't use the cache.")
     
     (options, args) = parser.parse_args()
 
     if len(args) >= 1:
         parser.error("No arguments needed!")
 
+    flt = None
+    if options.filter is not None:
+        try:
+            flt = LintFilter(options.filter)
+        except ValueError, e:
+            parser.error(str(e))
+
     cmn.build_path = options.bpath
     cmn.src_path = options.spath
 
-    nres = LintResult(options.new_file, cmn.build_path)
-    nres.process()
+    if options.baseline is not None:
+        baseline = LintBaseline(options.baseline)
+        nnew = baseline.gate(os.path.join(cmn.build_path, options.new_file),
+                             options.collect)
+        if nnew:
+            print >> sys.stderr, '%d new lint message(s) found.' % (nnew)
+            sys.exit(1)
+        return
+
+    ## Creates './report' for the comparison reports as well.
+    ui = UI()
+
+    if options.history_dir is not None:
+        trend = LintTrend(options.history_dir)
+        trend.process(options.workers)
+        trend.report()
+        return
+
+    cache = None
+    if options.use_cache:
+        cache = LintCache(options.cache_dir)
+
+    db = None
+    if options.db_path is not None:
+        db = LintDB(options.db_path)
+
+    if db is not None and options.run is not None:
+        nres = DBResult(db, options.run)
+    else:
+        nres = LintResult(options.new_file, cmn.build_path)
+        nres.process(options.workers, cache, options.use_mmap, options.lazy)
+        if db is not None and not db.has_current_run(nres):
+            db.ingest(nres)
+
+    if flt is not None:
+        if not isinstance(nres, LintResult):
+            print 'Filtering needs a parsed lint output, not a stored run.\n'
+            return
+        nres = flt.apply(nres)
+        if nres.get_total() == 0:
+            print 'No lint message matches the filter.\n'
+            return
+
+    if options.baseline_out is not None:
+        write_baseline(nres, options.baseline_out)
+        print '\nBaseline %s has been written.\n' % (options.baseline_out)
+        return
+
+    if options.query_file is not None:
+        if options.query_file == '-':
+            nqueries = LintQuery(nres).run(sys.stdin, sys.stdout)
+        else:
+            with open(options.query_file, 'r') as fin:
+                nqueries = LintQuery(nres).run(fin, sys.stdout)
+        print >> sys.stderr, '%d queries answered.' % (nqueries)
+        return
+
+    if options.serve_port is not None:
+        if not isinstance(nres, LintResult):
+            print 'Serving needs a parsed lint output, not a stored run.\n'
+            return
+        server = LintServer(nres, port=options.serve_port,
+                            workers=options.serve_threads)
+        print 'Serving %s on http://%s:%d/' % ((nres.fname,) + server.get_address())
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if options.export_dir is not None:
+        for path in LintExport(nres).export(options.export_dir, options.export_format):
+            print '%s has been exported.' % (path)
+        return
 
+    ## A SQLite connection can't be shared with forked processes,
+    ## reports of a stored run are generated serially.
+    report_workers = options.workers
+    if not isinstance(nres, LintResult):
+        report_workers = 1
+
+    ores = None
     if options.old_file is not None:
         ores = LintResult(options.old_file, cmn.build_path)
-        ores.process()
-        lintcmp = LintCmp(ores, nres)
-        lintcmp.report()
-
-    ui = UI()
-    ui.generate_report(nres)
+        ores.process(options.workers, cache, options.use_mmap, options.lazy)
+        if db is not None and not db.has_current_run(ores):
+            db.ingest(ores)
+        if flt is not None:
+            ores = flt.apply(ores)
+            if ores.get_total() == 0:
+                print 'No lint message of the old output matches the filter, it is compared as empty.\n'
+        if options.diff and not isinstance(nres, LintResult):
+            print 'Message diff needs a parsed lint output, not a stored run.\n'
+
+    ## A filter may drop whole types, report the ones it kept.
+    report_types = cmp_types = REPORT_TYPES
+    if flt is not None:
+        report_types = get_report_types(nres)
+        cmp_types = report_types
+        if ores is not None:
+            cmp_types = sorted(set(report_types) | set(get_report_types(ores)),
+                               reverse=True)
+
+    def generate_reports():
+        if not isinstance(nres, LintResult):
+            nres.reconnect()
+        if ores is not None:
+            LintCmp(ores, nres).report(cmp_types, report_workers)
+            if options.diff and isinstance(nres, LintResult):
+                LintDiff(ores, nres, SourceHashes(options.cache_dir)).report()
+        ui.generate_report(nres, report_workers, report_types)
+
+    ## Reports are generated in the background, the console
+    ## is usable as soon as the outputs are parsed.
+    if not options.no_reports:
+        ui.report_job = ReportJob(generate_reports)
+        ui.report_job.start()
     ui.start(nres)
 
 
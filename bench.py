@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks guarding against performance regressions.
+Run 'python bench.py', a benchmark fails when its time
+doesn't scale linearly with the input size.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import common as cmn
+from LintResult import LintResult, LintMsg, RecordStore
+from LintCmp import LintCmp
+
+## Allowed growth of the time per record between the
+## smallest and the largest run of a benchmark.
+MAX_SLOWDOWN = 2.0
+
+def timeit(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+def add_records_across_files(nfiles):
+    """
+    Add one record per file for a single message id,
+    like message 960 spread over the whole code base.
+    """
+    store = RecordStore()
+    msg = LintMsg(960, store)
+    for i in xrange(nfiles):
+        fname = 'dir%d/file%d.c' % (i % 97, i)
+        rec, fid = store.add(960, fname, i, 'desc')
+        msg.add_record('c', store.fnames[fid], fid, rec)
+    msg.get_flist_by_type('c')
+
+def write_output(path, fnames, msgid):
+    with open(path, 'w') as f:
+        for fname in fnames:
+            f.write('%s:1: Note: bench  [PC-Lint %d]\n' % (fname, msgid))
+
+def make_cmp(tmpdir, nfiles):
+    """
+    Return a 'LintCmp' of two results where message 960 hits
+    'nfiles' files, a third of them only in the old or new result.
+    """
+    cmn.src_path = ''
+    fnames = ['dir%d/file%d.c' % (i % 97, i) for i in xrange(nfiles)]
+    write_output(os.path.join(tmpdir, 'lint.old'), fnames[: nfiles * 2 / 3], 960)
+    write_output(os.path.join(tmpdir, 'lint.new'), fnames[nfiles / 3 :], 960)
+    ores = LintResult('lint.old', tmpdir)
+    ores.process()
+    nres = LintResult('lint.new', tmpdir)
+    nres.process()
+    return LintCmp(ores, nres)
+
+def legacy_file_rows(lintcmp, msgid):
+    """
+    Pairing of old and new files done by 'LintCmp.report_file_by_id'
+    before the join was hash based.
+    """
+    hlist, clist = lintcmp.ores.get_flist_by_id(msgid)
+    fcnt_o = hlist + clist
+    flist_o = [f for f, c in fcnt_o]
+    hlist, clist = lintcmp.nres.get_flist_by_id(msgid)
+    fcnt_n = hlist + clist
+    flist_n = [f for f, c in fcnt_n]
+
+    comb = []
+    for f in set(flist_o).intersection(flist_n):
+        comb.append((f, fcnt_o[flist_o.index(f)][1], fcnt_n[flist_n.index(f)][1]))
+    for f in set(flist_o) - set(flist_n):
+        comb.append((f, fcnt_o[flist_o.index(f)][1], 0))
+    for f in set(flist_n) - set(flist_o):
+        comb.append((f, 0, fcnt_n[flist_n.index(f)][1]))
+    return comb
+
+def bench_file_join(sizes):
+    """
+    Compare the legacy pairing with 'LintCmp.iter_file_rows'.
+    Return False if the join doesn't scale linearly.
+    """
+    tmpdir = tempfile.mkdtemp()
+    old_src_path = cmn.src_path
+    try:
+        print 'LintCmp file join, one id across n files'
+        per_item = []
+        for n in sizes:
+            lintcmp = make_cmp(tmpdir, n)
+            t_legacy = timeit(legacy_file_rows, lintcmp, 960)
+            t_join = timeit(list, lintcmp.iter_file_rows([960]))
+            per_item.append(t_join / n)
+            print '  n=%-8d legacy %8.3fs  join %8.3fs  speedup %.1fx' % \
+                (n, t_legacy, t_join, t_legacy / max(t_join, 1e-9))
+    finally:
+        cmn.src_path = old_src_path
+        shutil.rmtree(tmpdir)
+
+    slowdown = per_item[-1] / per_item[0]
+    ok = slowdown <= MAX_SLOWDOWN
+    print '  slowdown %.2fx %s' % (slowdown, ok and 'ok' or 'FAILED')
+    return ok
+
+def check_linear(name, func, sizes):
+    """
+    Run 'func' for each size in 'sizes' and report the time
+    per item. Return False if it grows more than 'MAX_SLOWDOWN'.
+    """
+    print name
+    per_item = []
+    for n in sizes:
+        t = timeit(func, n)
+        per_item.append(t / n)
+        print '  n=%-8d %8.3fs %8.2fus/item' % (n, t, t / n * 1e6)
+
+    slowdown = per_item[-1] / per_item[0]
+    ok = slowdown <= MAX_SLOWDOWN
+    print '  slowdown %.2fx %s' % (slowdown, ok and 'ok' or 'FAILED')
+    return ok
+
+def main():
+    ok = check_linear('LintMsg.add_record, one id across n files',
+                      add_records_across_files, [25000, 50000, 100000])
+    ok = bench_file_join([5000, 10000, 20000]) and ok
+    if not ok:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
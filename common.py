@@ -2,6 +2,8 @@
 
 import os
 import re
+import heapq
+import bisect
 
 build_path = ''
 src_path = ''
@@ -21,6 +23,9 @@ fileTypes = ['c', 'h']
 ## Common pattern for message specified by lint.
 ## Like [PC-Lint 960]
 lint_msg_pat = r'\[PC-Lint [\d]{1,3}\]'
+## Precompiled form of 'lint_msg_pat' capturing the message id,
+## so 'findall' returns the id strings directly.
+lint_msg_re = re.compile(r'\[PC-Lint ([\d]{1,3})\]')
 
 def toInt(s):
     m = re.search(r'[\d]{1,4}', s) 
@@ -29,15 +34,88 @@ def toInt(s):
 def getMsgTypes():
     return mtype2range.keys()
 
+def buildMsgTypeTable(size):
+    """
+    Return a list mapping every message id below 'size'
+    to its message type, or None if the id is in no range.
+    """
+    table = [None] * size
+    for mtype, rg in mtype2range.iteritems():
+        for msgid in xrange(rg[0], min(rg[1], size)):
+            table[msgid] = mtype
+    return table
+
+## Dense lookup table of message types, indexed by message id.
+## It covers all the 4-digit ids 'toInt' accepts.
+msgid2type = buildMsgTypeTable(10000)
+
 def getMsgTypeByID(msgid):
     """
     Return string format of message type of a given
     message id 'msgid'.
     """
-    for mtype, rg in mtype2range.iteritems():
-        if msgid in range(rg[0], rg[1]):
-            return mtype
+    if 0 <= msgid < len(msgid2type):
+        return msgid2type[msgid]
 
 def getRangeOfMsgType(mtype):
     return mtype2range[mtype]
-        
+
+def topK(k, items, key):
+    """
+    Return the 'k' items of iterable 'items' with the smallest 'key',
+    sorted by it. Items are consumed one at a time and only 'k' of
+    them are kept in a heap, so ranking n items costs O(n log k).
+    """
+    return heapq.nsmallest(k, items, key=key)
+
+## Sort keys of the hotspot rankings, for the items of 'topK'.
+def fileCountKey((fname, cnt)):
+    return (-cnt, fname)
+
+def lineCountKey((fname, line, nids, cnt)):
+    return (-nids, -cnt, fname, line)
+
+## Fewest messages a file needs to be ranked by density, so one
+## message near the top of a file doesn't lead the ranking.
+DENSITY_MIN_COUNT = 3
+
+## Map source file name to its number of lines, None if unreadable.
+fname2nlines = {}
+
+def getSrcLineCount(fname):
+    """
+    Return the number of lines of source file 'fname' under
+    'src_path', or None if it can't be read.
+    """
+    if not fname2nlines.has_key(fname):
+        try:
+            with open(os.path.join(src_path, fname), 'rb') as f:
+                fname2nlines[fname] = sum(1 for line in f)
+        except IOError:
+            fname2nlines[fname] = None
+    return fname2nlines[fname]
+
+def topDensity(k, counts, min_count=DENSITY_MIN_COUNT):
+    """
+    Return [(file, count, lines)] of the 'k' files of 'counts', an
+    iterable of (file, count, last line#), with the most messages
+    per line. 'lines' is the line count of the source file, or its
+    last line with a message if the source is shorter or can't be
+    read. Files with fewer than 'min_count' messages are skipped.
+
+    'lines' is at least the last line#, so count / last line# bounds
+    the density of a file. Files are visited by decreasing bound and
+    sources are only read until the bound can't beat the k-th file.
+    """
+    bounds = sorted(((-float(cnt) / max(last, 1), fname, cnt, last)
+                     for fname, cnt, last in counts if cnt >= min_count))
+    if k <= 0:
+        return []
+    ## Sorted (key, item) of the best files found so far.
+    best = []
+    for bound, fname, cnt, last in bounds:
+        if len(best) >= k and best[k - 1][0] < (bound, fname):
+            break
+        nlines = max(getSrcLineCount(fname) or 0, last, 1)
+        bisect.insort(best, ((-float(cnt) / nlines, fname), (fname, cnt, nlines)))
+    return [item for key, item in best[:k]]